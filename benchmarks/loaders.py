@@ -0,0 +1,90 @@
+'''
+Time spent waiting for the mini-batches of graph-level datasets, per training epoch, with and without prefetching. Eg.
+
+    python -B -m benchmarks.loaders --dataset QM9 --gnn GCN --prefetch 0 2 4 --device_index 0
+
+The data-wait time is the time the training loop is blocked on the loader, ie. collating the next
+mini-batch (when not prefetched) or waiting for the background thread to have it ready.
+'''
+
+import argparse
+from time import perf_counter
+import warnings; warnings.filterwarnings('ignore')
+
+import torch
+from torch.optim import Adam
+
+from dataset import get_dataset, BaseDataset
+from dataset.utils import PrefetchLoader
+from model import Model
+from utils.config import parse_arguments
+from utils.format import format_task_name
+
+
+def synchronize(device):
+
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+
+def time_epoch(dataset: BaseDataset, model: Model, optimizer: Adam, device: torch.device):
+
+    model.train()
+    data_wait = 0.
+    synchronize(device)
+    start = perf_counter()
+
+    iterator = iter(dataset.train_loader)
+    while True:
+        wait_start = perf_counter()
+        try:
+            batch = next(iterator)
+        except StopIteration:
+            break
+        data_wait += perf_counter() - wait_start
+        optimizer.zero_grad()
+        out = model(batch.x, batch.edge_index, batch.batch)
+        train_loss = dataset.compute_loss(out, batch.y)
+        train_loss.backward()
+        optimizer.step()
+    dataset.aggregate_metrics()
+    synchronize(device)
+
+    return data_wait, perf_counter() - start
+
+def benchmark(dataset: BaseDataset, model: Model, device: torch.device, n_epochs: int = 5):
+
+    optimizer = Adam(model.parameters(), lr=1e-3)
+    time_epoch(dataset, model, optimizer, device)   # warm-up
+
+    data_wait, total = 0., 0.
+    for _ in range(n_epochs):
+        epoch_wait, epoch_total = time_epoch(dataset, model, optimizer, device)
+        data_wait += epoch_wait; total += epoch_total
+
+    return data_wait / n_epochs, total / n_epochs
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--prefetch', type=int, nargs='+', default=[0, 2, 4], help='Prefetch depths to compare; 0 for no prefetching.')
+    parser.add_argument('--n_epochs', type=int, default=5)
+    # the other arguments set up the dataset and the model, as in main.py
+    args, unknown = parser.parse_known_args()
+    config, others = parse_arguments(return_others=True, args=unknown+['--exp_dir', ''])
+
+    DEVICE = torch.device(f'cuda:{config.device_index}' if torch.cuda.is_available() and config.device_index is not None else 'cpu')
+
+    dataset = get_dataset(config.dataset, config=config, others=others, device=DEVICE)
+    if config.collate_once:
+        dataset.collate_once()
+    others.input_dim = dataset.num_features
+    others.output_dim = dataset.output_dim
+    others.task_name = format_task_name.get(dataset.task_name.lower())
+    model = Model(config, others).to(DEVICE)
+
+    train_loader = dataset.train_loader
+    for depth in args.prefetch:
+        dataset.train_loader = PrefetchLoader(train_loader, depth=depth) if depth > 0 else train_loader
+        data_wait, total = benchmark(dataset, model, DEVICE, args.n_epochs)
+        print(f'{config.dataset}, prefetch = {depth}: {1e3*data_wait:.1f} ms data-wait per epoch, out of {1e3*total:.1f} ms')
\ No newline at end of file
@@ -0,0 +1,169 @@
+'''
+Per-batch overhead of accumulating the metrics, over the training split of graph-level datasets, with the metrics
+accumulated on the device (see metrics.base and metrics.classification), and with the former per-batch path as the
+baseline, which synchronizes with the host on every batch (`.item()` on the loss, and torchmetrics with input
+validation). Eg.
+
+    python -B -m benchmarks.metrics --datasets Proteins Mutag Enzymes QM9 --device_index 0
+
+Model outputs are replaced with random logits, and the batches are collated beforehand,
+so that only the time spent in `compute_loss` (and once per epoch, `aggregate_metrics`) is measured.
+'''
+
+import argparse
+from time import perf_counter
+import warnings; warnings.filterwarnings('ignore')
+
+import torch
+from torch.nn import BCEWithLogitsLoss, CrossEntropyLoss
+from torchmetrics import MeanAbsoluteError, MeanAbsolutePercentageError, MeanSquaredError
+from torchmetrics.classification import BinaryAccuracy, BinaryF1Score, BinaryAUROC, \
+    MulticlassAccuracy, MulticlassF1Score, MulticlassAUROC
+
+from dataset import get_dataset, BaseDataset
+from metrics import Metrics, Regression
+
+
+class PerBatchClassification(Metrics):
+
+    # the former Classification, which moves the loss to the host on every batch
+
+    def __init__(self, num_classes: int, device: torch.device):
+
+        super(PerBatchClassification, self).__init__()
+
+        if num_classes == 2:
+            self.nonlinearity = torch.sigmoid
+            self.loss_fn = lambda input, target: BCEWithLogitsLoss(reduction='sum')(input, target.float())
+            self.accuracy_fn = BinaryAccuracy().to(device)
+            self.f1score_fn = BinaryF1Score().to(device)
+            self.auroc_fn = BinaryAUROC().to(device)
+        else:
+            self.nonlinearity = lambda probs: torch.softmax(probs, dim=-1)
+            self.loss_fn = CrossEntropyLoss(reduction='sum')
+            self.accuracy_fn = MulticlassAccuracy(num_classes).to(device)
+            self.f1score_fn = MulticlassF1Score(num_classes).to(device)
+            self.auroc_fn = MulticlassAUROC(num_classes).to(device)
+
+        self.reset()
+
+    def reset(self):
+
+        self.n_samples = self.total_ce_loss = 0
+        self.accuracy_fn.reset()
+        self.f1score_fn.reset()
+        self.auroc_fn.reset()
+
+    def compute_loss(self, input, target):
+
+        input = input.squeeze()
+        batch_ce_loss = self.loss_fn(input, target)
+        self.total_ce_loss += batch_ce_loss.item()
+        self.n_samples += target.size(0)
+
+        preds = self.nonlinearity(input)
+        self.accuracy_fn.update(preds, target)
+        self.f1score_fn.update(preds, target)
+        self.auroc_fn.update(preds, target)
+
+        return batch_ce_loss / target.size(0)
+
+    def aggregate_metrics(self):
+
+        metrics = [
+            ('Cross Entropy Loss', self.total_ce_loss / self.n_samples),
+            ('Accuracy', self.accuracy_fn.compute().item()),
+            ('F1 Score', self.f1score_fn.compute().item()),
+            ('AU-ROC', self.auroc_fn.compute().item()),
+        ]
+        self.reset()
+
+        return metrics
+
+
+class PerBatchRegression(Metrics):
+
+    # the former Regression, which runs torchmetrics (with input validation) on every batch
+
+    def __init__(self, num_classes: int, device: torch.device):
+
+        super(PerBatchRegression, self).__init__()
+
+        self.mean_absolute_error = MeanAbsoluteError().to(device)
+        self.mean_absolute_percentage_error = MeanAbsolutePercentageError().to(device)
+        self.mean_squared_error = MeanSquaredError().to(device)
+
+    def reset(self):
+
+        self.mean_absolute_error.reset()
+        self.mean_absolute_percentage_error.reset()
+        self.mean_squared_error.reset()
+
+    def compute_loss(self, input, target):
+
+        input = input.reshape(target.shape)
+        mse = self.mean_squared_error.forward(input, target)
+        self.mean_absolute_error.update(input, target)
+        self.mean_absolute_percentage_error.update(input, target)
+
+        return mse
+
+    def aggregate_metrics(self):
+
+        metrics = [
+            ('Mean Squared Error', self.mean_squared_error.compute().item()),
+            ('Mean Absolute Error', self.mean_absolute_error.compute().item()),
+            ('Mean Absolute Percentage Error', self.mean_absolute_percentage_error.compute().item()),
+        ]
+        self.reset()
+
+        return metrics
+
+
+def synchronize(device):
+
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+
+def benchmark(dataset: BaseDataset, device: torch.device, n_epochs: int = 10):
+
+    batches = [
+        (torch.randn(batch.num_graphs, dataset.output_dim, device=device, requires_grad=True), batch.y.to(device))
+        for batch in dataset.train_loader
+    ]
+
+    # warm-up
+    for out, target in batches:
+        dataset.compute_loss(out, target)
+    dataset.aggregate_metrics()
+    synchronize(device)
+
+    start = perf_counter()
+    for _ in range(n_epochs):
+        for out, target in batches:
+            dataset.compute_loss(out, target)
+        dataset.aggregate_metrics()
+    synchronize(device)
+
+    return (perf_counter() - start) / (n_epochs * len(batches))
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--datasets', type=str, nargs='+', default=['Proteins', 'Mutag', 'Enzymes', 'Reddit', 'IMDb', 'Collab'])
+    parser.add_argument('--n_epochs', type=int, default=10)
+    parser.add_argument('--device_index', type=int, default=None)
+    args = parser.parse_args()
+
+    DEVICE = torch.device(f'cuda:{args.device_index}' if torch.cuda.is_available() and args.device_index is not None else 'cpu')
+
+    for dataset_name in args.datasets:
+        dataset = get_dataset(dataset_name, device=DEVICE)
+        metrics = dataset.metrics
+        per_batch_metrics = (PerBatchRegression if isinstance(metrics, Regression) else PerBatchClassification)(dataset.num_classes, DEVICE)
+        times = list()
+        for dataset_metrics in (per_batch_metrics, metrics):
+            dataset.metrics = dataset_metrics
+            times.append(benchmark(dataset, DEVICE, args.n_epochs))
+        print(f'{dataset_name}: {1e6*times[0]:.1f} us per batch with per-batch syncs, {1e6*times[1]:.1f} us accumulated on the device ({times[0]/times[1]:.2f}x)')
\ No newline at end of file
@@ -0,0 +1,72 @@
+'''
+Time per training epoch of the replicates of a model, vectorized by vmap and looped over, eg. with the packed masks
+of the dropping methods, which are drawn for each replicate inside vmap. Eg.
+
+    python -B -m benchmarks.replicates --dataset Cora --gnn GCN --dropout DropMessage --drop_p 0.5 --replicates 4 --packed_masks true
+
+Only the strategies in model.replicates.VECTORIZABLE are vectorized; the others are looped over either way.
+'''
+
+import argparse
+from time import perf_counter
+import warnings; warnings.filterwarnings('ignore')
+
+import torch
+from torch.optim import Adam
+
+from dataset import get_dataset, BaseDataset
+from model import Model
+from model.replicates import Replicates, ReplicateOptimizer
+from utils.config import parse_arguments
+from utils.format import format_task_name
+
+
+def synchronize(device):
+
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+
+def benchmark(dataset: BaseDataset, model: Replicates, optimizer: ReplicateOptimizer, device: torch.device, n_epochs: int = 5):
+
+    dataset.train(model, optimizer)   # warm-up
+    synchronize(device)
+
+    start = perf_counter()
+    for _ in range(n_epochs):
+        dataset.train(model, optimizer)
+    synchronize(device)
+
+    return (perf_counter() - start) / n_epochs
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_epochs', type=int, default=5)
+    # the other arguments set up the dataset and the model, as in main.py
+    args, unknown = parser.parse_known_args()
+    config, others = parse_arguments(return_others=True, args=unknown+['--exp_dir', ''])
+
+    DEVICE = torch.device(f'cuda:{config.device_index}' if torch.cuda.is_available() and config.device_index is not None else 'cpu')
+
+    dataset = get_dataset(config.dataset, config=config, others=others, device=DEVICE)
+    if config.collate_once:
+        dataset.collate_once()
+    others.input_dim = dataset.num_features
+    others.output_dim = dataset.output_dim
+    others.task_name = format_task_name.get(dataset.task_name.lower())
+    if others.task_name.lower().startswith('node') and hasattr(others, 'pooler'):
+        delattr(others, 'pooler')
+    dataset.replicate_metrics(config.replicates)
+
+    models = [Model(config, others).to(DEVICE) for _ in range(config.replicates)]
+    model = Replicates(models)
+    optimizer = ReplicateOptimizer([Adam(replicate.parameters(), lr=config.learning_rate) for replicate in models])
+
+    vectorizable = model.vectorize
+    times = list()
+    for vectorize in (False, True) if vectorizable else (False,):
+        model.vectorize = vectorize
+        times.append(benchmark(dataset, model, optimizer, DEVICE, args.n_epochs))
+    summary = f', {1e3*times[1]:.1f} ms vectorized ({times[0]/times[1]:.2f}x)' if vectorizable else ', not vectorizable'
+    print(f'{config.dataset}, {config.dropout}, {config.replicates} replicates: {1e3*times[0]:.1f} ms looped{summary}')
\ No newline at end of file
@@ -0,0 +1,77 @@
+'''
+Time to drop the edges of node-level datasets, and treat the adjacency matrix with the kept ones, per layer,
+over the grid of dropping probabilities in tables/best_probability.py, with and without sampling the positions of
+the kept edges (`--skip_sampling`). Eg.
+
+    python -B -m benchmarks.sampling --datasets Cora PubMed --dropouts DropEdge DropSens --device_index 0
+
+The treatment is the one of GCNLayer.compute_adj_mat, ie. the edge mask drawn by the strategy, and the self loops
+and normalization added to the kept edges by ModelPretreatment.masked_pretreatment.
+'''
+
+import argparse
+from argparse import Namespace
+from time import perf_counter
+import warnings; warnings.filterwarnings('ignore')
+
+import numpy as np
+import torch
+from torch_geometric.utils import remove_self_loops
+
+from dataset import get_dataset
+from model.dropout import get_dropout
+from model.message_passing.pretreatment import ModelPretreatment
+
+
+def synchronize(device):
+
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+
+def benchmark(edge_index, num_nodes: int, drop_strategy, device: torch.device, n_repeats: int = 100):
+
+    pt = ModelPretreatment()
+
+    def treat_adj_mat():
+        edge_mask = drop_strategy.edge_mask(edge_index, training=True)
+        return pt.masked_pretreatment(num_nodes, edge_index, edge_mask, torch.float)
+
+    # warm-up, eg. solving the DropSens probabilities
+    treat_adj_mat()
+    synchronize(device)
+
+    start = perf_counter()
+    for _ in range(n_repeats):
+        treat_adj_mat()
+    synchronize(device)
+
+    return (perf_counter() - start) / n_repeats
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--datasets', type=str, nargs='+', default=['Cora', 'CiteSeer', 'PubMed', 'Chameleon', 'Squirrel', 'TwitchDE'])
+    parser.add_argument('--dropouts', type=str, nargs='+', default=['DropEdge', 'DropSens'])
+    parser.add_argument('--info_loss_ratio', type=float, default=0.8, help='Ratio of information to preserve per edge for DropSens.')
+    parser.add_argument('--n_repeats', type=int, default=100)
+    parser.add_argument('--device_index', type=int, default=None)
+    args = parser.parse_args()
+
+    DEVICE = torch.device(f'cuda:{args.device_index}' if torch.cuda.is_available() and args.device_index is not None else 'cpu')
+    # grid of tables/best_probability.py
+    drop_ps = np.round(np.arange(0.1, 1, 0.1), decimals=1)
+
+    for dataset_name in args.datasets:
+        dataset = get_dataset(dataset_name, device=DEVICE)
+        # as after GCNLayer.strip_adj_mat
+        edge_index, _ = remove_self_loops(dataset.edge_index)
+        num_nodes = dataset.x.size(0)
+        for dropout in args.dropouts:
+            for drop_p in drop_ps:
+                times = list()
+                for skip_sampling in (False, True):
+                    others = Namespace(info_loss_ratio=args.info_loss_ratio, task_name='node-c', skip_sampling=skip_sampling)
+                    drop_strategy = get_dropout(dropout)(float(drop_p), others=others)
+                    times.append(benchmark(edge_index, num_nodes, drop_strategy, DEVICE, args.n_repeats))
+                print(f'{dataset_name}, {dropout}, P = {drop_p}: {1e6*times[0]:.1f} us with a mask, {1e6*times[1]:.1f} us with skip sampling ({times[0]/times[1]:.2f}x)')
\ No newline at end of file
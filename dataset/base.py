@@ -1,8 +1,10 @@
-from typing import Tuple, Dict
+from typing import Tuple, Dict, List, Optional
 import torch
 from torch.optim import Optimizer
-from metrics import Metrics, Classification, Regression
+from torch.utils.data import RandomSampler
+from metrics import Metrics, Classification, Regression, ReplicateMetrics
 from model import Model
+from dataset.utils import CollatedLoader, PrefetchLoader
 
     
 def set_metrics(task_name: str, num_classes: int, device: torch.device) -> Tuple[Metrics, int]:
@@ -27,7 +29,43 @@ class BaseDataset:
     def __init__(self, task_name: str, device: torch.device):
 
         self.metrics, self.output_dim = set_metrics(task_name, self.num_classes, device)
+        # datasets with fixed splits draw no permutation
+        self.permutations = getattr(self, 'permutations', list())
+
+    def permutation(self, size: int, permutations: Optional[List[torch.Tensor]] = None) -> torch.Tensor:
+
+        '''
+        Random permutation of `size` indices to split the dataset by, or the next one of `permutations`, eg. the ones
+        a resumed run was split by (see main.py). The permutations are kept in `self.permutations`, in order.
+        '''
+
+        if not hasattr(self, 'permutations'):
+            self.permutations = list()
+        if permutations is None:
+            permutation = torch.randperm(size)
+        else:
+            permutation = permutations[len(self.permutations)]
+            if permutation.size(0) != size:
+                raise ValueError(f'Expected a permutation of {size} indices, but got one of {permutation.size(0)}.')
+        self.permutations.append(permutation)
+
+        return permutation
+
+    def replicate_metrics(self, n_replicates: int):
+
+        # keep separate metrics for each replicate when training replicates together
+        self.metrics = ReplicateMetrics(self.metrics, n_replicates)
         
+    def collate_once(self):
+
+        # only inductive datasets are loaded in mini-batches
+        pass
+
+    def prefetch(self, depth: int):
+
+        # only inductive datasets are loaded in mini-batches
+        pass
+
     def reset_metrics(self):
 
         return self.metrics.reset()
@@ -71,9 +109,10 @@ class Transductive(BaseDataset):
         model.eval()
         out = model(self.x, self.edge_index, mask=None)
 
-        self.compute_loss(out[self.val_mask], self.y[self.val_mask])
+        # index the node dimension, preceded by the replicate dimension when training replicates
+        self.compute_loss(out[..., self.val_mask, :], self.y[self.val_mask])
         val_metrics = self.aggregate_metrics()
-        self.compute_loss(out[self.test_mask], self.y[self.test_mask])
+        self.compute_loss(out[..., self.test_mask, :], self.y[self.test_mask])
         test_metrics = self.aggregate_metrics()
 
         return val_metrics, test_metrics
@@ -81,6 +120,22 @@ class Transductive(BaseDataset):
 
 class Inductive(BaseDataset):
 
+    def collate_once(self):
+
+        # gather the mini-batches from the splits collated once, instead of collating them every epoch
+        self.train_loader, self.val_loader, self.test_loader = (
+            CollatedLoader(loader.dataset, batch_size=loader.batch_size, shuffle=isinstance(loader.sampler, RandomSampler))
+            for loader in (self.train_loader, self.val_loader, self.test_loader)
+        )
+
+    def prefetch(self, depth: int):
+
+        # prepare the next `depth` mini-batches in a background thread, while training on the current one
+        self.train_loader, self.val_loader, self.test_loader = (
+            PrefetchLoader(loader, depth=depth)
+            for loader in (self.train_loader, self.val_loader, self.test_loader)
+        )
+
     def train(self, model: Model, optimizer: Optimizer) -> Dict[str, float]:
 
         model.train()
@@ -0,0 +1,83 @@
+import hashlib
+import inspect
+import json
+import os
+
+import torch
+from torch_geometric.data import Data, InMemoryDataset
+
+from dataset.constants import root
+from dataset.preprocess import canonicalize
+
+
+# Bump whenever the preprocessing of a dataset changes outside of the functions in the cache key (see `describe`),
+# eg. in a function they call, so that stale caches are not loaded
+CACHE_VERSION = 3
+cache_root = f'{root}/Cache'
+
+
+class CachedDataset(InMemoryDataset):
+
+    def __init__(self, data, slices):
+        super(CachedDataset, self).__init__()
+        self.data, self.slices = data, slices
+
+
+def describe(value):
+
+    # functions (eg. pre_transform) are identified by their name and a hash of their source, so that editing them
+    # invalidates the cache
+    if not hasattr(value, '__code__'):
+        return getattr(value, '__qualname__', value)
+    try:
+        code = inspect.getsource(value).encode()
+    except (OSError, TypeError):
+        code = value.__code__.co_code
+
+    return f'{value.__qualname__}-{hashlib.sha1(code).hexdigest()[:16]}'
+
+def cache_fn(dataset_class, preprocess=None, **kwargs):
+
+    options = {key: describe(value) for key, value in kwargs.items()}
+    options['preprocess'] = describe(preprocess)
+    options['canonicalize'] = describe(canonicalize)
+    options = json.dumps(options, sort_keys=True, default=str)
+    digest = hashlib.sha1(options.encode()).hexdigest()[:16]
+
+    return f'{cache_root}/{dataset_class.__name__}/v{CACHE_VERSION}-{digest}', options
+
+def load_cached(dataset_class, preprocess=None, **kwargs):
+
+    '''
+    Load a PyG dataset, after applying `preprocess` to each of its graphs, and putting their edges in the
+    canonical form (see dataset.preprocess), from the on-disk cache. The cache is written on the first call,
+    and memory-mapped on every call after.
+
+    Only what is the same for every run is cached, ie. the graphs once processed by the dataset class (eg.
+    with the `pre_transform` of TUDataset) and `preprocess`; the shuffles, the splits and the normalizations
+    computed on the training split (eg. of QM9 and LRGB) are redone per run, since each run draws its own split.
+
+    Args:
+        dataset_class: PyG dataset class, eg. torch_geometric.datasets.TUDataset.
+        preprocess: function applied to each graph (Data) in the dataset before caching.
+        kwargs: arguments to initialize `dataset_class` with, which are also part of the cache key.
+    '''
+
+    fn, options = cache_fn(dataset_class, preprocess, **kwargs)
+
+    if not os.path.isfile(f'{fn}.pt'):
+        dataset = dataset_class(**kwargs)
+        data, slices = InMemoryDataset.collate([
+            canonicalize(datum if preprocess is None else preprocess(datum)) for datum in dataset
+        ])
+        os.makedirs(os.path.dirname(fn), exist_ok=True)
+        # write to a temporary file first, since other processes may be reading or writing the same cache
+        tmp_fn = f'{fn}.{os.getpid()}.tmp'
+        torch.save({'data': data.to_dict(), 'slices': slices}, tmp_fn)
+        os.replace(tmp_fn, f'{fn}.pt')
+        with open(f'{fn}.json', 'w') as f:
+            f.write(options)
+
+    cached = torch.load(f'{fn}.pt', mmap=True, weights_only=True)
+
+    return CachedDataset(Data.from_dict(cached['data']), cached['slices'])
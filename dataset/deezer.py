@@ -3,20 +3,20 @@ from torch_geometric.datasets import DeezerEurope as DeezerTorch
 
 from dataset.constants import root
 from dataset.base import Transductive
-from dataset.utils import split_dataset
+from dataset.utils import load_dataset, split_dataset
 
 
 class Deezer(Transductive):
 
     def __init__(self, device: torch.device, **kwargs):
 
-        dataset = DeezerTorch(root=f'{root}/Deezer').to(device)
+        dataset = load_dataset(DeezerTorch, root=f'{root}/Deezer').to(device)
 
         self.x = dataset.x
         self.edge_index = dataset.edge_index
         self.y = dataset.y
 
-        indices = torch.randperm(self.x.size(0))
+        indices = self.permutation(self.x.size(0), kwargs.get('permutations'))
         self.train_mask, self.val_mask, self.test_mask = split_dataset(indices)
     
         self.task_name = 'node-c'
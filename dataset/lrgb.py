@@ -3,7 +3,7 @@ from torch_geometric.datasets import LRGBDataset as LRGBDatasetTorch
 
 from dataset.constants import root
 from dataset.base import Inductive
-from dataset.utils import normalize_features, create_loaders
+from dataset.utils import load_dataset, normalize_features, create_loaders
 
 
 class LRGBDataset(Inductive):
@@ -11,9 +11,10 @@ class LRGBDataset(Inductive):
     def __init__(self, name: str, device: torch.device, **kwargs):
 
         train, val, test = (
-            LRGBDatasetTorch(root=root, name=name, split=split).to(device).shuffle()
+            load_dataset(LRGBDatasetTorch, root=root, name=name, split=split).to(device)
             for split in ('train', 'val', 'test')
         )
+        train, val, test = (split[self.permutation(len(split), kwargs.get('permutations'))] for split in (train, val, test))
 
         sizes = 1500, 250, 250
         batch_size = 20 
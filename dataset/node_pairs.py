@@ -0,0 +1,191 @@
+'''
+Index of the node pairs of every graph in a dataset, sorted by a pairwise measure (eg. shortest distance or
+commute time), to sample node pairs at any distance or quantile without recomputing the measure.
+
+Each graph's (flattened) matrix of the measure is stably sorted, so that node pairs with the same value stay
+in row-major order, ie. the order in which torch.where lists them, and stored as the sorted values and the
+flat positions they came from. Runs of equal values are located once when the index is loaded, after which
+the node pairs at a quantile are found in O(1) per graph, and those at a value in one pass over the runs.
+'''
+
+import multiprocessing
+import os
+import random
+
+import torch
+from tqdm import tqdm
+
+from dataset.utils import segment_index
+
+
+def shortest_distances(edge_indices):
+
+    from sensitivity.utils import compute_shortest_distances
+
+    matrices = [compute_shortest_distances(edge_index) for edge_index in edge_indices]    # List[Tensor(|V|x|V|)]
+    sizes = torch.tensor([matrix.size(0) for matrix in matrices], dtype=torch.long)
+
+    return torch.cat([matrix.float().flatten() for matrix in matrices]), sizes
+
+def commute_times(edge_indices):
+
+    from sensitivity.utils import compute_commute_times_batched
+
+    commute_times, _, sizes = compute_commute_times_batched(edge_indices)
+
+    return commute_times, sizes
+
+def approximate_commute_times(edge_indices, eps=0.3):
+
+    from sensitivity.utils import approximate_commute_times
+
+    # a fixed seed per graph, so that the index does not depend on how the graphs are split between processes
+    matrices = [approximate_commute_times(edge_index, eps=eps, generator=torch.Generator().manual_seed(0)) for edge_index in edge_indices]
+    sizes = torch.tensor([matrix.size(0) for matrix in matrices], dtype=torch.long)
+
+    return torch.cat([matrix.flatten() for matrix in matrices]), sizes
+
+MEASURES = {
+    'shortest_distances': shortest_distances,
+    'commute_times': commute_times,
+    'approximate_commute_times': approximate_commute_times,
+}
+
+
+def init_worker():
+
+    # the pool's processes split the cores between them
+    torch.set_num_threads(1)
+
+def compute_measure(args):
+
+    measure, edge_indices, kwargs = args
+
+    return MEASURES[measure](edge_indices, **kwargs)
+
+def sort_segments(values, sizes):
+
+    '''
+    Stably sort each graph's (flattened) matrix, returning the sorted values and their flat positions in the matrix.
+    '''
+
+    counts = sizes**2
+    ptr = counts.cumsum(dim=0) - counts
+    sorted_values, positions = torch.empty_like(values), torch.empty(values.size(0), dtype=torch.int)
+    # graphs of the same size are sorted together, as the rows of a matrix
+    for size in sizes.unique().tolist():
+        ids = (sizes == size).nonzero().flatten()
+        index = segment_index(ptr[ids], counts[ids]).view(ids.size(0), size**2)
+        graph_values, graph_positions = torch.sort(values[index], dim=1, stable=True)
+        sorted_values[index], positions[index] = graph_values, graph_positions.int()
+
+    return sorted_values, positions
+
+
+class NodePairIndex:
+
+    def __init__(self, sizes, values, positions):
+
+        '''
+        Args:
+            sizes (Tensor): size of the matrix of each graph, ie. its number of nodes (G,).
+            values (Tensor): sorted values of the matrices, concatenated over the graphs (sum(sizes^2),).
+            positions (Tensor): flat (row-major) position of each value in its graph's matrix (sum(sizes^2),).
+        '''
+
+        self.sizes, self.values, self.positions = sizes, values, positions
+
+        counts = sizes.long() ** 2
+        self.ptr = torch.cat((counts.new_zeros(1), counts.cumsum(dim=0)))
+        # a run starts at the start of a graph, or where the value changes
+        is_start = torch.ones(values.size(0), dtype=torch.bool)
+        is_start[1:] = values[1:] != values[:-1]
+        is_start[self.ptr[:-1][counts > 0]] = True
+        self.run_ids = is_start.cumsum(dim=0) - 1
+        self.run_starts = torch.cat((is_start.nonzero().flatten(), self.ptr[-1:]))
+        self.run_graphs = torch.searchsorted(self.ptr, self.run_starts[:-1], right=True) - 1
+
+    @classmethod
+    def build(cls, dataset, measure: str, workers: int = 1, **kwargs):
+
+        '''
+        Compute the measure for every graph of `dataset`, in chunks of graphs on a pool of `workers` processes.
+        The keyword arguments are passed to the measure, eg. `eps` to approximate_commute_times.
+        '''
+
+        edge_indices = [datum.edge_index for datum in dataset]
+        # chunks of graphs, so that the measure can be batched over the graphs of a chunk
+        chunk_size = max(1, -(-len(edge_indices) // (4*workers))) if workers > 1 else max(1, len(edge_indices))
+        args = [(measure, edge_indices[i:i+chunk_size], kwargs) for i in range(0, len(edge_indices), chunk_size)]
+        if workers > 1:
+            context = multiprocessing.get_context('spawn')
+            with context.Pool(workers, initializer=init_worker) as pool:
+                results = list(tqdm(pool.imap(compute_measure, args), total=len(args)))
+        else:
+            results = list(map(compute_measure, args))
+
+        values, sizes = map(torch.cat, zip(*results))
+        values, positions = sort_segments(values, sizes)
+
+        return cls(sizes.int(), values, positions)
+
+    def save(self, fn: str):
+
+        os.makedirs(os.path.dirname(fn), exist_ok=True)
+        tmp_fn = f'{fn}.{os.getpid()}.tmp'
+        torch.save({'sizes': self.sizes, 'values': self.values, 'positions': self.positions}, tmp_fn)
+        os.replace(tmp_fn, fn)
+
+    @classmethod
+    def load(cls, fn: str):
+
+        return cls(**torch.load(fn, weights_only=True))
+
+    def runs_at_value(self, value: float):
+
+        '''
+        Start and length of the run of pairs with exactly `value` in each graph (length 0 if there is none).
+        '''
+
+        starts, counts = torch.zeros(self.sizes.size(0), dtype=torch.long), torch.zeros(self.sizes.size(0), dtype=torch.long)
+        runs = (self.values[self.run_starts[:-1]] == value).nonzero().flatten()
+        starts[self.run_graphs[runs]] = self.run_starts[runs]
+        counts[self.run_graphs[runs]] = self.run_starts[runs+1] - self.run_starts[runs]
+
+        return starts, counts
+
+    def runs_at_quantile(self, q: float):
+
+        '''
+        Start and length of the run of pairs with the `q`-quantile value in each graph, where the quantile
+        is taken with torch.quantile(..., interpolation='nearest'), computing the rank as it does.
+        '''
+
+        counts = self.ptr[1:] - self.ptr[:-1]
+        ranks = (torch.tensor(q, dtype=torch.float).double() * (counts-1)).round().long()
+        runs = self.run_ids[(self.ptr[:-1] + ranks).clamp(min=0, max=self.values.size(0)-1)]
+        starts = self.run_starts[runs]
+        counts = torch.where(counts > 0, self.run_starts[runs+1] - starts, 0)
+
+        return starts, counts
+
+    def sample(self, starts, counts):
+
+        '''
+        Sample a node pair from each run uniformly at random, with python's RNG, or None for empty runs.
+
+        Returns:
+            node_pairs (List[Optional[List[int]]]): [row, column] of the sampled pair in each graph.
+        '''
+
+        node_pairs = list()
+        for graph, (start, count) in enumerate(zip(starts.tolist(), counts.tolist())):
+            try:
+                sample = random.randint(0, count-1)                     # Int in range [0, count-1]
+            except ValueError:
+                node_pairs.append(None)                                 # No pair in the run
+                continue
+            position, size = self.positions[start+sample].item(), self.sizes[graph].item()
+            node_pairs.append([position // size, position % size])
+
+        return node_pairs
@@ -3,13 +3,14 @@ from torch_geometric.datasets import Planetoid as PlanetoidTorch
 
 from dataset.constants import root
 from dataset.base import Transductive
+from dataset.utils import load_dataset
 
 
 class Planetoid(Transductive):
 
     def __init__(self, name: str, device: torch.device, **kwargs):
 
-        dataset = PlanetoidTorch(root=f'{root}/Planetoid', name=name, split='full').to(device)
+        dataset = load_dataset(PlanetoidTorch, root=f'{root}/Planetoid', name=name, split='full').to(device)
 
         # don't normalize features since they are indicator variables
 
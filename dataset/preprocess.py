@@ -0,0 +1,33 @@
+'''
+Canonical form of the graphs, applied to every dataset when it is loaded (and cached):
+    - duplicate edges are removed, keeping the first of them
+    - self loops are kept: the layers which add self loops remove the existing ones first, and with
+      --add_self_loops false they are aggregated like any other edge, as in the raw dataset
+    - edges are sorted by destination, then source
+
+The edges sorted by destination are the CSR layout of the transposed adjacency matrix, with the sources as
+its column indices, and the pointer of the destinations computed in O(|E|) from edge_index[1]. Dropping edges
+with a mask keeps them sorted, and so does collating graphs into a mini-batch, which shifts the node indices
+of each graph past those of the graphs before it. The layers then read the degrees off the pointer, and
+aggregate the messages of each node as a contiguous segment, instead of scattering them.
+'''
+
+import torch
+
+
+def canonicalize(datum):
+
+    num_nodes = datum.num_nodes
+    row, col = datum.edge_index
+
+    # sort by destination, then source -- stably, so that the first of the duplicates is kept
+    edge_keys, perm = torch.sort(col * num_nodes + row, stable=True)
+    is_first = torch.ones_like(edge_keys, dtype=torch.bool)
+    is_first[1:] = edge_keys[1:] != edge_keys[:-1]
+    perm = perm[is_first]
+
+    # permute every edge-level attribute, eg. edge_attr, along with edge_index
+    for key in datum.edge_attrs():
+        datum[key] = datum[key].index_select(datum.__cat_dim__(key, datum[key]), perm)
+
+    return datum
\ No newline at end of file
@@ -3,15 +3,15 @@ from torch_geometric.datasets import QM9 as QM9Torch
 
 from dataset.constants import root, batch_size
 from dataset.base import Inductive
-from dataset.utils import split_dataset, normalize_features, normalize_labels, create_loaders
+from dataset.utils import load_dataset, split_dataset, normalize_features, normalize_labels, create_loaders
 
 
 class QM9(Inductive):
 
     def __init__(self, device: torch.device, **kwargs):
 
-        dataset = QM9Torch(root=f'{root}/QM9').to(device)
-        dataset = dataset.shuffle()
+        dataset = load_dataset(QM9Torch, root=f'{root}/QM9').to(device)
+        dataset = dataset[self.permutation(len(dataset), kwargs.get('permutations'))]
 
         self.train_loader, self.val_loader, self.test_loader = create_loaders(
             normalize_labels(*normalize_features(*split_dataset(dataset))),
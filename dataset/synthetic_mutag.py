@@ -34,7 +34,7 @@ class PreTransform:
 
 class SyntheticMutag(Inductive):
 
-    def __init__(self, config: Namespace, others: Namespace, device: torch.device):
+    def __init__(self, config: Namespace, others: Namespace, device: torch.device, **kwargs):
 
         config, others = map(lambda x: Namespace(**vars(x)), (config, others))
 
@@ -48,7 +48,7 @@ class SyntheticMutag(Inductive):
             use_node_attr=True,
             pre_transform=PreTransform(config, others)
         ).to(device)
-        dataset = dataset.shuffle()
+        dataset = dataset[self.permutation(len(dataset), kwargs.get('permutations'))]
 
         self.train_loader, self.val_loader, self.test_loader = create_loaders(
             split_dataset(dataset),
@@ -4,15 +4,17 @@ if __name__ == '__main__':
 from argparse import Namespace
 import os
 import random
-from tqdm import tqdm
 import pickle
 
 import torch
+from torch_geometric.data import Data
 from torch_geometric.datasets import ZINC as ZINCTorch
 
 from dataset.constants import root, batch_size
 from dataset.base import Inductive
-from dataset.utils import create_loaders
+from dataset.cache import CachedDataset
+from dataset.node_pairs import NodePairIndex
+from dataset.utils import load_dataset, create_loaders, segment_index
 
 
 root = f'{root}/ZINC'
@@ -21,6 +23,8 @@ batch_size = 250    # Divisible by 1k
 
 class SyntheticZINC(Inductive):
 
+    measure_kwargs = dict()
+
     def __init__(self, node_pairs_fn: str, device: torch.device, others: Namespace, **kwargs):
 
         self.distance = self.process_args(others)
@@ -47,22 +51,18 @@ class SyntheticZINC(Inductive):
 
     def make_dataset(self, node_pairs_fn, split, size, device):
 
-        dataset = ZINCTorch(root=root, subset=True, split=split)
-        dataset = list(enumerate(dataset))
+        dataset = load_dataset(ZINCTorch, root=root, subset=True, split=split)
+        indices = list(range(len(dataset)))
         if size is not None:
-            random.shuffle(dataset)
-            dataset = dataset[:size]
+            random.shuffle(indices)
+            indices = indices[:size]
         
         # Get sampled node pairs separated by `distance` hops
         node_pairs = self.get_node_pairs(node_pairs_fn, split)
-        # Create node-level features, and graph-level labels
-        data_list = [self.make_features_and_labels(datum, node_pairs[index]) for index, datum in dataset]
-        # Filter out molecules with no two nodes separated by `distance`
-        data_list = [datum.to(device) for datum in data_list if datum is not None]
-        # TODO: Create custom dataset (just to be able to use GPUs efficiently)
-        # dataset = CustomDataset(data_list)
+        # Create node-level features, and graph-level labels, for all molecules at once
+        dataset = self.make_features_and_labels(dataset, torch.tensor(indices, dtype=torch.long), node_pairs)
         
-        return data_list
+        return dataset.to(device)
 
     def get_node_pairs(self, node_pairs_fn: str, split: str):
 
@@ -72,18 +72,9 @@ class SyntheticZINC(Inductive):
                 node_pairs = pickle.load(f)
             return node_pairs
 
-        dataset = ZINCTorch(root=root, subset=True, split=split)
-        node_pairs = list()
-
-        # For each molecule, sample a node pair separated by `distance`
-        for datum in tqdm(dataset):
-            choices = self.get_node_pair_choices(datum.edge_index)          # Tuple[row indices, column indices]
-            try:
-                sample = random.randint(0, choices[0].size(0)-1)            # Int in range [0, num_mathces-1]
-                node_pair = list(map(lambda x: x[sample].item(), choices))  # List[row, column]
-            except ValueError:
-                node_pair = None                                            # No pair separated by `distance`
-            node_pairs.append(node_pair)
+        # For each molecule, sample a node pair separated by `distance` from the index
+        index = self.load_node_pair_index(node_pairs_fn, split, self.measure, **self.measure_kwargs)
+        node_pairs = index.sample(*self.get_node_pair_runs(index))  # List[Optional[List[row, column]]]
 
         os.makedirs(os.path.dirname(fn), exist_ok=True)
         with open(fn, 'wb') as f:
@@ -91,24 +82,55 @@ class SyntheticZINC(Inductive):
 
         return node_pairs
 
-    def make_features_and_labels(self, datum, node_pair):
-                
-        datum.x = torch.zeros_like(datum.x, dtype=torch.float)  # Set all node features to 0
-        if node_pair is not None:
-            features = torch.rand(len(node_pair))               # Sample random features
-            datum.x[node_pair, :] = features.unsqueeze(1)       # Set features for the pair of nodes
-            datum.y = torch.tanh(features.sum())                # Set graph-level label
-            return datum
-        else:
-            return None
+    @staticmethod
+    def load_node_pair_index(node_pairs_fn: str, split: str, measure: str, workers: int = 1, **kwargs):
+
+        fn = f'{root}/{node_pairs_fn}/index/{split}.pt'
+        if os.path.isfile(fn):
+            return NodePairIndex.load(fn)
+
+        dataset = load_dataset(ZINCTorch, root=root, subset=True, split=split)
+        index = NodePairIndex.build(dataset, measure, workers, **kwargs)
+        index.save(fn)
+
+        return index
+
+    def make_features_and_labels(self, dataset, indices, node_pairs):
+
+        data, slices = dataset._data, dataset.slices
+
+        # Filter out molecules with no two nodes separated by `distance`
+        pairs = torch.tensor([node_pairs[index] or (-1, -1) for index in indices.tolist()], dtype=torch.long).view(-1, 2)
+        indices, pairs = indices[pairs[:, 0] >= 0], pairs[pairs[:, 0] >= 0]
+
+        # Gather the nodes and edges of the remaining molecules (edge indices are stored per molecule)
+        node_counts = slices['x'][indices+1] - slices['x'][indices]
+        edge_counts = slices['edge_index'][indices+1] - slices['edge_index'][indices]
+        edges = segment_index(slices['edge_index'][indices], edge_counts)
+        node_offsets = node_counts.cumsum(dim=0) - node_counts
+
+        x = torch.zeros((int(node_counts.sum()), data.x.size(1)), dtype=torch.float)   # Set all node features to 0
+        features = torch.rand(indices.size(0), 2)                                      # Sample random features
+        x[node_offsets+pairs[:, 0], :] = features[:, 0:1]                              # Set features for the pair of nodes,
+        x[node_offsets+pairs[:, 1], :] = features[:, 1:2]                              #   keeping the second if they are the same
+        y = torch.tanh(features.sum(dim=1))                                            # Set graph-level labels
+
+        node_slices = torch.cat((node_counts.new_zeros(1), node_counts.cumsum(dim=0)))
+        edge_slices = torch.cat((edge_counts.new_zeros(1), edge_counts.cumsum(dim=0)))
+        data = Data(x=x, edge_index=data.edge_index[:, edges], edge_attr=data.edge_attr[edges], y=y)
+        slices = {'x': node_slices, 'edge_index': edge_slices, 'edge_attr': edge_slices, 'y': torch.arange(indices.size(0)+1)}
 
-    def get_node_pair_choices(self, edge_index):
+        return CachedDataset(data, slices)
+
+    def get_node_pair_runs(self, index: NodePairIndex):
 
         raise NotImplementedError
 
 
 class SyntheticZINC_SD(SyntheticZINC):
 
+    measure = 'shortest_distances'
+
     def __init__(self, device: torch.device, others: Namespace, **kwargs):
 
         super(SyntheticZINC_SD, self).__init__(self.__class__.__name__, device, others)
@@ -121,41 +143,37 @@ class SyntheticZINC_SD(SyntheticZINC):
 
         return distance
 
-    def get_node_pair_choices(self, edge_index):
+    def get_node_pair_runs(self, index: NodePairIndex):
 
-        global compute_shortest_distances
-        from sensitivity.utils import compute_shortest_distances
-
-        shortest_distances = compute_shortest_distances(edge_index) # Tensor(|E|x|E|)
-        choices = torch.where(shortest_distances == self.distance)  # Tuple[row indices, column indices]
-
-        return choices
+        # Pairs with shortest distance equal to `distance`
+        return index.runs_at_value(self.distance)
 
 
 class SyntheticZINC_CT(SyntheticZINC):
 
+    measure = 'commute_times'
+
     def __init__(self, device: torch.device, others: Namespace, **kwargs):
 
-        super(SyntheticZINC_CT, self).__init__(self.__class__.__name__, device, others)
+        node_pairs_fn = self.__class__.__name__
+        if getattr(others, 'ct_eps', None) is not None:
+            node_pairs_fn = f'{node_pairs_fn}/eps={others.ct_eps}'
+        super(SyntheticZINC_CT, self).__init__(node_pairs_fn, device, others)
 
     def process_args(self, others: Namespace):
 
         super(SyntheticZINC_CT, self).process_args(others)
         distance = float(others.distance)
         assert 0 <= distance <= 1
+        if getattr(others, 'ct_eps', None) is not None:
+            self.measure, self.measure_kwargs = 'approximate_commute_times', {'eps': float(others.ct_eps)}
 
         return distance
     
-    def get_node_pair_choices(self, edge_index):
-
-        global compute_commute_times
-        from sensitivity.utils import compute_commute_times
-
-        commute_times = compute_commute_times(edge_index)   # Tensor(|E|x|E|)
-        quantile = torch.quantile(commute_times.flatten(), q=self.distance, interpolation='nearest')
-        choices = torch.where(commute_times == quantile)    # Tuple[row indices, column indices]
+    def get_node_pair_runs(self, index: NodePairIndex):
 
-        return choices
+        # Pairs with commute time equal to its `distance`-quantile in the molecule
+        return index.runs_at_quantile(self.distance)
 
 
 if __name__ == '__main__':
@@ -166,11 +184,20 @@ if __name__ == '__main__':
 
     parser = argparse.ArgumentParser()
     parser.add_argument('--step', type=float, required=True)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--ct_eps', type=float)
     args = parser.parse_args()
 
     device = torch.device('cpu')
     distances = list(map(lambda x: round(x, str(args.step)[::-1].find('.')), np.arange(0.0, 1+args.step, args.step)))
 
+    # Compute the commute times of all molecules once, then sample the node pairs for each distance
+    if args.ct_eps is None:
+        node_pairs_fn, measure, kwargs = 'SyntheticZINC_CT', 'commute_times', dict()
+    else:
+        node_pairs_fn, measure, kwargs = f'SyntheticZINC_CT/eps={args.ct_eps}', 'approximate_commute_times', {'eps': args.ct_eps}
+    for split in ('train', 'val', 'test'):
+        SyntheticZINC_CT.load_node_pair_index(node_pairs_fn, split, measure, workers=args.workers, **kwargs)
     for distance in distances:
-        others = Namespace(distance=distance, pooler='max')
+        others = Namespace(distance=distance, pooler='max', ct_eps=args.ct_eps)
         SyntheticZINC_CT(device, others)
\ No newline at end of file
@@ -3,7 +3,7 @@ from torch_geometric.datasets import TUDataset as TUDatasetTorch
 
 from dataset.constants import root, batch_size
 from dataset.base import Inductive
-from dataset.utils import split_dataset, create_loaders
+from dataset.utils import load_dataset, split_dataset, create_loaders
 
 
 def pre_transform(datum):
@@ -21,13 +21,14 @@ class TUDataset(Inductive):
 
     def __init__(self, name: str, device: torch.device, **kwargs):
 
-        dataset = TUDatasetTorch(
+        dataset = load_dataset(
+            TUDatasetTorch,
             root=f'{root}/TUDataset',
             name=name,
             use_node_attr=True,
             pre_transform=pre_transform,
         ).to(device)
-        dataset = dataset.shuffle()
+        dataset = dataset[self.permutation(len(dataset), kwargs.get('permutations'))]
         
         # (80, 10, 10) splits and batch_size=64 following Karhadkar et al. (2022)
         self.train_loader, self.val_loader, self.test_loader = create_loaders(
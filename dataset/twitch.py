@@ -3,21 +3,20 @@ from torch_geometric.datasets import Twitch as TwitchTorch
 
 from dataset.constants import root
 from dataset.base import Transductive
-from dataset.utils import split_dataset, normalize_features
+from dataset.utils import load_dataset, split_dataset, standardize_features
 
 
 class Twitch(Transductive):
 
     def __init__(self, name: str, device: torch.device, **kwargs):
 
-        dataset = TwitchTorch(root=f'{root}/Twitch', name=name).to(device)
-        dataset, = normalize_features(dataset)
+        dataset = load_dataset(TwitchTorch, standardize_features, root=f'{root}/Twitch', name=name).to(device)
 
         self.x = dataset.x
         self.edge_index = dataset.edge_index
         self.y = dataset.y
         
-        indices = torch.randperm(dataset.x.size(0))
+        indices = self.permutation(dataset.x.size(0), kwargs.get('permutations'))
         self.train_mask, self.val_mask, self.test_mask = split_dataset(indices)
 
         self.task_name = 'node-c'
@@ -1,8 +1,15 @@
+from copy import copy
+from queue import Queue, Empty, Full
+from threading import Thread, Event
+
 import torch
-from torch_geometric.data import InMemoryDataset
+from torch.utils.data import DataLoader as IndexLoader
+from torch_geometric.data import InMemoryDataset, Batch
 from torch_geometric.loader import DataLoader
+from torch_geometric.utils import to_undirected, remove_self_loops
 
 from dataset.constants import Splits, batch_size
+from dataset.cache import load_cached
 
 
 class CustomDataset(InMemoryDataset):
@@ -18,6 +25,45 @@ class CustomDataset(InMemoryDataset):
         return self.get(index)
 
 
+# PyG datasets already loaded by this process, eg. by a sweep worker running many cells
+_loaded = dict()
+
+
+def load_dataset(dataset_class, preprocess=None, **kwargs):
+
+    '''
+    Load a PyG dataset from the on-disk cache once per process, and return a fresh copy of it on every call.
+
+    The copy shares the underlying tensors, but not the storage holding them, so
+    that moving it to a device, shuffling and normalizing it leave the loaded dataset as is.
+    '''
+
+    key = (dataset_class, preprocess, tuple(sorted(kwargs.items())))
+    if key not in _loaded:
+        _loaded[key] = load_cached(dataset_class, preprocess, **kwargs)
+
+    dataset = copy(_loaded[key])
+    dataset._data = copy(dataset._data)
+    dataset._data_list = None
+
+    return dataset
+
+
+def make_undirected(datum):
+
+    datum.edge_index = to_undirected(remove_self_loops(datum.edge_index)[0], num_nodes=datum.num_nodes)
+
+    return datum
+
+
+def standardize_features(datum):
+
+    std, mean = torch.std_mean(datum.x, dim=0, keepdim=True)
+    datum.x = (datum.x - mean) / std
+
+    return datum
+
+
 def split_dataset(dataset, train_split=Splits.train_split, val_split=Splits.val_split, test_split=None):
 
     if test_split is not None:
@@ -67,11 +113,178 @@ def normalize_labels(train, *others):
     return out
 
 
-def create_loaders(splits, **kwargs):
+def create_loaders(splits, prefetch=0, device=None, **kwargs):
+
+    '''
+    Args:
+        splits: datasets to create loaders for, eg. (train, val, test).
+        prefetch (int): number of mini-batches to prepare ahead, in a background thread; 0 to not prefetch.
+        device (torch.device): device to move the prefetched mini-batches to, if not already on it.
+        kwargs: arguments for torch_geometric.loader.DataLoader, eg. batch_size.
+    '''
 
     out = ()
     
     for split in splits:
-        out += (DataLoader(split, **kwargs),)
+        loader = DataLoader(split, **kwargs)
+        if prefetch > 0:
+            loader = PrefetchLoader(loader, depth=prefetch, device=device)
+        out += (loader,)
     
-    return out
\ No newline at end of file
+    return out
+
+
+def segment_index(starts, counts):
+
+    # indices of the segments [starts[i], starts[i]+counts[i]), concatenated
+    offsets = counts.cumsum(dim=0) - counts
+    return torch.arange(int(counts.sum())) + torch.repeat_interleave(starts - offsets, counts)
+
+
+class CollatedLoader:
+
+    def __init__(self, dataset, batch_size=1, shuffle=False):
+
+        '''
+        Drop-in replacement for torch_geometric.loader.DataLoader, which collates all the graphs into a
+        single batch once, and gathers the mini-batches from it, instead of collating every mini-batch
+        from the individual graphs. The collated tensors stay on the device of the graphs; only the
+        gather indices are computed on the CPU, with vectorized operations.
+
+        The graphs of each mini-batch are sampled by the same sampler as DataLoader, with the same draws
+        from torch's RNG, so the mini-batches (and the rest of the run) are the same with either loader.
+
+        Args:
+            dataset: graphs to load, eg. a PyG dataset or a list of Data objects.
+            batch_size (int): number of graphs per mini-batch.
+            shuffle (bool): reshuffle the graphs every epoch.
+        '''
+
+        self.dataset = dataset
+        self.collated = Batch.from_data_list(list(dataset))
+        # the node (index) valued attributes, eg. edge_index, are incremented by the number of nodes of the preceding graphs
+        self.attributes = {
+            key: (self.collated.__cat_dim__(key, self.collated[key]), slices.cpu(), bool(self.collated._inc_dict[key].any()))
+            for key, slices in self.collated._slice_dict.items() if isinstance(self.collated[key], torch.Tensor)
+        }
+        self.node_slices = self.collated.ptr.cpu()
+        self.index_loader = IndexLoader(range(len(self.node_slices)-1), batch_size=batch_size, shuffle=shuffle)
+
+    def __len__(self):
+
+        return len(self.index_loader)
+
+    def __iter__(self):
+
+        for graphs in self.index_loader:
+            yield self.gather(graphs)
+
+    def gather(self, graphs):
+
+        device = self.collated.ptr.device
+        node_starts = self.node_slices[graphs]
+        node_counts = self.node_slices[graphs+1] - node_starts
+        # shift from the node indices in the collated batch to those in the mini-batch
+        node_shifts = node_starts - (node_counts.cumsum(dim=0) - node_counts)
+
+        out = dict()
+        for key, (cat_dim, slices, incremented) in self.attributes.items():
+            starts, counts = slices[graphs], slices[graphs+1] - slices[graphs]
+            value = self.collated[key].index_select(cat_dim, segment_index(starts, counts).to(device))
+            if incremented:
+                value = value - torch.repeat_interleave(node_shifts, counts).to(device)
+            out[key] = value
+        out['batch'] = torch.repeat_interleave(torch.arange(graphs.size(0)), node_counts).to(device)
+        out['ptr'] = torch.cat((node_counts.new_zeros(1), node_counts.cumsum(dim=0))).to(device)
+
+        return Batch(**out)
+
+
+class PrefetchLoader:
+
+    # marks the end of an epoch in the queue
+    END = object()
+
+    def __init__(self, loader, depth=2, device=None):
+
+        '''
+        Wraps a loader, so that the next `depth` mini-batches are collated (and moved to the device,
+        from pinned memory) by a background thread, while the current one is being used.
+
+        The first mini-batch of every epoch is drawn in the calling thread, so that the shuffling
+        draws from torch's RNG happen at the same point as without prefetching; the rest of
+        the epoch only collates, which draws nothing.
+
+        Args:
+            loader: loader to prefetch from, eg. DataLoader or CollatedLoader.
+            depth (int): maximum number of mini-batches prepared ahead.
+            device (torch.device): device to move the mini-batches to, if not already on it.
+        '''
+
+        self.loader = loader
+        self.dataset = loader.dataset
+        self.depth = depth
+        self.device = device
+
+    def __len__(self):
+
+        return len(self.loader)
+
+    def to_device(self, batch):
+
+        if self.device is None or batch.x.device == self.device:
+            return batch
+        if self.device.type == 'cuda':
+            batch = batch.pin_memory()
+        return batch.to(self.device, non_blocking=True)
+
+    def put(self, queue, stop, item):
+
+        # wait for space in the queue, unless the consumer has stopped
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def produce(self, iterator, queue, stop):
+
+        try:
+            for batch in iterator:
+                if not self.put(queue, stop, self.to_device(batch)):
+                    return
+            self.put(queue, stop, self.END)
+        except Exception as exception:
+            self.put(queue, stop, exception)
+
+    def __iter__(self):
+
+        iterator = iter(self.loader)
+        try:
+            first = next(iterator)
+        except StopIteration:
+            return
+
+        queue, stop = Queue(maxsize=self.depth), Event()
+        producer = Thread(target=self.produce, args=(iterator, queue, stop), daemon=True)
+        producer.start()
+        try:
+            yield self.to_device(first)
+            while True:
+                batch = queue.get()
+                if batch is self.END:
+                    break
+                if isinstance(batch, Exception):
+                    raise batch
+                yield batch
+        finally:
+            # the consumer may stop early, eg. on an exception; release the producer and wait for it
+            stop.set()
+            while True:
+                try:
+                    queue.get_nowait()
+                except Empty:
+                    break
+            producer.join()
\ No newline at end of file
@@ -1,25 +1,24 @@
 import torch
 from torch_geometric.datasets import WikipediaNetwork as WikipediaTorch
-from torch_geometric.utils import to_undirected, remove_self_loops
 
 from dataset.constants import root
 from dataset.base import Transductive
-from dataset.utils import split_dataset
+from dataset.utils import load_dataset, make_undirected, split_dataset
 
 
 class Wikipedia(Transductive):
 
     def __init__(self, name: str, device: torch.device, **kwargs):
 
-        dataset = WikipediaTorch(root=f'{root}/Wikipedia', name=name).to(device)
+        dataset = load_dataset(WikipediaTorch, make_undirected, root=f'{root}/Wikipedia', name=name).to(device)
 
         self.x = dataset[0].x
-        ### Important to make the graph undirected, GCN does not learn without it
+        ### Important to make the graph undirected (done once, before caching), GCN does not learn without it
         ### TODO: Should not have to make undirected
-        self.edge_index = to_undirected(remove_self_loops(dataset[0].edge_index)[0])
+        self.edge_index = dataset[0].edge_index
         self.y = dataset[0].y
 
-        indices = torch.randperm(self.x.size(0))
+        indices = self.permutation(self.x.size(0), kwargs.get('permutations'))
         self.train_mask, self.val_mask, self.test_mask = split_dataset(indices)
 
         self.task_name = 'node-c'
@@ -0,0 +1,212 @@
+'''
+Run a grid of experiments on a pool of worker processes, in place of the bash scripts. Eg.
+
+    python -B -m experiments.sweep --spec experiments/black.json --workers 4 --override dataset=Cora gnn=GCN
+
+Each worker imports torch and PyG once and keeps the datasets it loads in memory, reusing them
+across the cells it runs. Cells are ordered by dataset, so that a worker mostly runs cells of the same dataset.
+'''
+
+import argparse
+from itertools import product
+import json
+import multiprocessing
+import os
+import time
+import traceback
+import warnings; warnings.filterwarnings('ignore')
+
+from utils.format import FormatEpoch
+from utils.logger import get_time
+from utils.summary import load_summary
+
+
+def parse_value(value):
+
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        return value
+
+def to_argv(args):
+
+    argv = list()
+    for key, value in args.items():
+        if value is None:
+            continue
+        argv.append(f'--{key}')
+        if isinstance(value, bool):
+            argv.append(str(value).lower())
+        elif isinstance(value, (list, tuple)):
+            argv.extend(map(str, value))
+        else:
+            argv.append(str(value))
+
+    return argv
+
+def format_args(args, cell):
+
+    '''
+    Fill in placeholders like `{sample}` in the string arguments, eg. `"model_sample": "{sample}"`.
+    '''
+
+    return {key: value.format(**cell) if isinstance(value, str) else value for key, value in args.items()}
+
+def make_cells(spec):
+
+    '''
+    Expand the grid of the sweep specification into a list of cells (one dict of arguments per cell).
+    '''
+
+    keys, values = zip(*spec['grid'].items()) if spec['grid'] else ((), ())
+    cells = dict()
+    for combination in product(*values):
+        cell = dict(zip(keys, combination))
+        # NoDrop ignores the dropping probability, so only run it once, with P=0.0
+        if cell.get('dropout') == 'NoDrop' and 'drop_p' in cell:
+            cell['drop_p'] = 0.0
+        cells[json.dumps(cell, sort_keys=True)] = cell
+
+    return list(cells.values())
+
+def is_complete(exp_dir, n_epochs):
+
+    '''
+    A run is complete if its summary says so, or, for runs without a summary,
+    if its logs contain the test metrics of the last epoch.
+    '''
+
+    summary = load_summary(exp_dir)
+    if summary is not None:
+        return summary['complete'] and summary['n_epochs'] == n_epochs
+
+    fn = f'{exp_dir}/metrics.jsonl'
+    if os.path.isfile(fn):
+        with open(fn, 'r') as f:
+            lines = f.read().splitlines()
+        # the test metrics are the last records of an epoch, barring a partially written line
+        for line in reversed(lines[-2:]):
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            return record['epoch'] == n_epochs and record['split'] == 'Testing'
+        return False
+
+    fn = f'{exp_dir}/logs'
+    if not os.path.isfile(fn):
+        return False
+    with open(fn, 'r') as f:
+        logs = f.read()
+    last_epoch = logs.rfind(f'Epoch {FormatEpoch(n_epochs)(n_epochs)}\n')
+
+    return last_epoch != -1 and 'Testing:' in logs[last_epoch:]
+
+def find_incomplete(spec):
+
+    '''
+    Compare the results tree with the sweep specification, and list the runs still to be done.
+
+    If the `exp_dir` template contains `{sample}`, each sample has a fixed directory which is
+    (re)run if incomplete. Otherwise, samples are timestamped directories under `exp_dir`, and
+    new ones are added until `total_samples` of them are complete.
+    '''
+
+    n_epochs = spec['args'].get('n_epochs', 300)
+    runs = list()
+
+    for cell in make_cells(spec):
+        values = {**spec['args'], **cell}
+        if '{sample}' in spec['exp_dir']:
+            for sample in range(1, spec['total_samples']+1):
+                exp_dir = spec['exp_dir'].format(**values, sample=sample)
+                if os.path.isdir(exp_dir) and is_complete(exp_dir, n_epochs):
+                    continue
+                runs.append((cell, sample, exp_dir))
+        else:
+            config_dir = spec['exp_dir'].format(**values)
+            timestamps = os.listdir(config_dir) if os.path.isdir(config_dir) else list()
+            num_samples = sum(is_complete(f'{config_dir}/{timestamp}', n_epochs) for timestamp in timestamps)
+            for sample in range(num_samples+1, spec['total_samples']+1):
+                runs.append((cell, sample, config_dir))
+
+    return runs
+
+def init_worker(num_threads):
+
+    import torch
+    torch.set_num_threads(num_threads)
+
+def run_cell(run):
+
+    from main import run as train
+    from utils.config import parse_arguments
+
+    (cell, sample, exp_dir), spec = run
+    if '{sample}' not in spec['exp_dir']:
+        # directories created within the same second, by different workers, still need to be unique
+        config_dir = exp_dir
+        exp_dir = f'{config_dir}/{get_time()}-{os.getpid()}'
+        while os.path.exists(exp_dir):
+            time.sleep(1)
+            exp_dir = f'{config_dir}/{get_time()}-{os.getpid()}'
+
+    args = {**format_args(spec['args'], {**cell, 'sample': sample}), **cell, 'exp_dir': exp_dir}
+    if '{sample}' in spec['exp_dir']:
+        # incomplete runs in fixed directories are continued from their checkpoints (or started over)
+        args = {'resume': True, **args}
+    try:
+        config, others = parse_arguments(return_others=True, args=to_argv(args))
+        train(config, others, progress=False)
+    except Exception:
+        return exp_dir, traceback.format_exc()
+
+    return exp_dir, None
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--spec', type=str, required=True, help='JSON file with the sweep specification.')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes.')
+    parser.add_argument(
+        '--override', type=str, nargs='*', default=[],
+        help='Override the spec as key=value, eg. `dataset=Cora` or `drop_p=[0.1,0.2]`.\n' \
+            '\tKeys in the grid replace the grid values, other keys replace the fixed arguments.'
+    )
+    parser.add_argument('--dry_run', action='store_true', help='Only print the runs still to be done.')
+    args = parser.parse_args()
+
+    with open(args.spec, 'r') as f:
+        spec = json.load(f)
+    for override in args.override:
+        key, value = override.split('=', maxsplit=1)
+        value = parse_value(value)
+        if key in ('exp_dir', 'total_samples'):
+            spec[key] = value
+        elif key in spec['grid']:
+            spec['grid'][key] = value if isinstance(value, list) else [value]
+        else:
+            spec['args'][key] = value
+
+    runs = find_incomplete(spec)
+    # keep cells of the same dataset together, so that workers reuse the datasets they have loaded
+    runs.sort(key=lambda run: str(run[0].get('dataset', spec['args'].get('dataset'))))
+    print(f'{len(runs)} runs to do.')
+    if args.dry_run:
+        for cell, sample, exp_dir in runs:
+            print(f'\t{exp_dir} (sample {sample})')
+        exit()
+
+    # split the cores between the workers, so that they do not oversubscribe them
+    num_threads = max(1, (os.cpu_count() or 1) // args.workers)
+    os.environ['OMP_NUM_THREADS'] = os.environ['MKL_NUM_THREADS'] = str(num_threads)
+
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(args.workers, initializer=init_worker, initargs=(num_threads,)) as pool:
+        chunksize = max(1, len(runs) // (4*args.workers))
+        for i, (exp_dir, error) in enumerate(pool.imap_unordered(run_cell, ((run, spec) for run in runs), chunksize=chunksize), start=1):
+            if error is None:
+                print(f'[{i}/{len(runs)}] Completed {exp_dir}.')
+            else:
+                print(f'[{i}/{len(runs)}] Failed {exp_dir}.\n{error}')
\ No newline at end of file
@@ -1,3 +1,5 @@
+import os
+from argparse import Namespace
 from tqdm import tqdm
 import warnings; warnings.filterwarnings('ignore')
 
@@ -7,63 +9,191 @@ from torch.optim.lr_scheduler import ReduceLROnPlateau
 
 from dataset import get_dataset, BaseDataset
 from model import Model
+from model.replicates import Replicates, ReplicateOptimizer
 from utils.config import parse_arguments
 from utils.logger import Logger, sci_notation
+from utils.summary import Summary, load_summary
+from utils.checkpoint import get_rng_states, set_rng_states, save_checkpoint, load_checkpoint
 from utils.format import format_task_name, FormatEpoch
 
 
-config, others = parse_arguments(return_others=True)
-DEVICE = torch.device(f'cuda:{config.device_index}' if torch.cuda.is_available() and config.device_index is not None else 'cpu')
+def run(config: Namespace, others: Namespace, progress: bool = True):
 
-dataset: BaseDataset = get_dataset(config.dataset, config=config, others=others, device=DEVICE)
-others.input_dim = dataset.num_features
-others.output_dim = dataset.output_dim
-others.task_name = format_task_name.get(dataset.task_name.lower())
-if others.task_name.lower().startswith('node') and hasattr(others, 'pooler'):
-    delattr(others, 'pooler')
+    '''
+    Train and log a model (or its replicates) with the parsed command line arguments.
+    '''
 
-model = Model(config, others)
-if config.dataset.lower().startswith('SyntheticZINC'.lower()) and others.model_sample is not None:
-    load_fn = f'./results/synthetic-zinc_state-dicts/{config.gnn}/sample={others.model_sample}.pt'
-    state_dict = torch.load(load_fn, map_location=torch.device('cpu'), weights_only=True)
-    model.load_state_dict(state_dict)
-    print(f'Successfully loaded state-dict {load_fn}.')
-model = model.to(DEVICE)
+    DEVICE = torch.device(f'cuda:{config.device_index}' if torch.cuda.is_available() and config.device_index is not None else 'cpu')
 
-lr = config.learning_rate
-optimizer = Adam(model.parameters(), lr=lr, weight_decay=config.weight_decay)
-if config.schedule_lr:
-    scheduling_metric = 'Cross Entropy Loss' if dataset.task_name.lower().endswith('-c') else 'Mean Absolute Error'
-    scheduler = ReduceLROnPlateau(
-        optimizer, patience=10//config.test_every, min_lr=1e-8,
-        # Default arguments, replicating FoSR (Karhadkar et al., 2022)
-        # https://github.com/kedar2/FoSR/blob/1a7360c2c77c42624bdc7ffef1490a2eb0a8afd0/experiments/graph_classification.py#L78
-    )
+    # the full training state is checkpointed in the logging directory (of the first replicate)
+    resume_fn = f"{config.exp_dir if config.replicates == 1 else f'{config.exp_dir}-1'}/resume.pt"
+    checkpoint, permutations = None, None
+    if config.resume:
+        summary = load_summary(os.path.dirname(resume_fn))
+        if summary is not None and summary['complete']:
+            print(f'Run {os.path.dirname(resume_fn)} is already complete.')
+            return
+        if os.path.isfile(resume_fn):
+            checkpoint = load_checkpoint(resume_fn)
+            # split the dataset by the saved permutations, and replay the RNG states that its other random
+            # draws (eg. the features of SyntheticZINC) were made from
+            permutations = checkpoint['split_permutations']
+            set_rng_states(checkpoint['dataset_rng_states'])
+    dataset_rng_states = get_rng_states()
+
+    dataset: BaseDataset = get_dataset(config.dataset, config=config, others=others, device=DEVICE, permutations=permutations)
+    if config.collate_once:
+        dataset.collate_once()
+    if config.prefetch > 0:
+        dataset.prefetch(config.prefetch)
+    others.input_dim = dataset.num_features
+    others.output_dim = dataset.output_dim
+    others.task_name = format_task_name.get(dataset.task_name.lower())
+    if others.task_name.lower().startswith('node') and hasattr(others, 'pooler'):
+        delattr(others, 'pooler')
 
-logger = Logger(config, others)
-format_epoch = FormatEpoch(config.n_epochs)
+    models = list()
+    for replicate in range(config.replicates):
+        model = Model(config, others)
+        if config.dataset.lower().startswith('SyntheticZINC'.lower()) and others.model_sample is not None:
+            # replicates load consecutive model samples
+            load_fn = f'./results/synthetic-zinc_state-dicts/{config.gnn}/sample={others.model_sample+replicate}.pt'
+            state_dict = torch.load(load_fn, map_location=torch.device('cpu'), weights_only=True)
+            model.load_state_dict(state_dict)
+            print(f'Successfully loaded state-dict {load_fn}.')
+        models.append(model.to(DEVICE))
 
-for epoch in tqdm(range(1, config.n_epochs+1)):
+    lrs = [config.learning_rate] * config.replicates
+    optimizers = [Adam(model.parameters(), lr=lr, weight_decay=config.weight_decay) for model, lr in zip(models, lrs)]
+    # validation metric monitored by the learning rate scheduler and early stopping
+    scheduling_metric = 'Cross Entropy Loss' if dataset.task_name.lower().endswith('-c') else 'Mean Absolute Error'
+    if config.schedule_lr:
+        schedulers = [ReduceLROnPlateau(
+            optimizer, patience=10//config.test_every, min_lr=1e-8,
+            # Default arguments, replicating FoSR (Karhadkar et al., 2022)
+            # https://github.com/kedar2/FoSR/blob/1a7360c2c77c42624bdc7ffef1490a2eb0a8afd0/experiments/graph_classification.py#L78
+        ) for optimizer in optimizers]
 
-    logger.log(f'Epoch {format_epoch(epoch)}', with_time=True)
-    train_metrics = dataset.train(model, optimizer)
-    logger.log_metrics(train_metrics, prefix='\tTraining:'.ljust(13), with_time=False)
+    if checkpoint is not None:
+        offsets = checkpoint['log_offsets']
+    elif config.resume:
+        # nothing to resume from, so start over (in the directory, if it exists)
+        offsets = [(0, 0)] * config.replicates
+    else:
+        offsets = [None] * config.replicates
 
-    if epoch == config.n_epochs or config.test_every > 0 and epoch % config.test_every == 0:
+    if config.replicates == 1:
+        model, optimizer = models[0], optimizers[0]
+        loggers = [Logger(config, others, text_metrics=config.text_metrics, offsets=offsets[0])]
+    else:
+        # train all replicates in a single forward and backward pass, logging each in its own directory
+        model, optimizer = Replicates(models), ReplicateOptimizer(optimizers)
+        dataset.replicate_metrics(config.replicates)
+        loggers = [
+            Logger(Namespace(**{**vars(config), 'exp_dir': f'{config.exp_dir}-{replicate}'}), others, text_metrics=config.text_metrics, offsets=offsets[replicate-1])
+            for replicate in range(1, config.replicates+1)
+        ]
+    summaries = [Summary(logger.exp_dir, config.n_epochs) for logger in loggers]
+    # states of the replicates at their best validation epochs, kept in memory and saved at the end
+    best_states = [None] * config.replicates
+    format_epoch = FormatEpoch(config.n_epochs)
 
-        val_metrics, test_metrics = dataset.eval(model)
-        logger.log_metrics(val_metrics, prefix='\tValidation:'.ljust(13), with_time=False)
-        logger.log_metrics(test_metrics, prefix='\tTesting:'.ljust(13), with_time=False)
-        
+    start_epoch = 1
+    if checkpoint is not None:
+        start_epoch = checkpoint['epoch'] + 1
+        for replicate_model, state in zip(models, checkpoint['models']):
+            replicate_model.load_state_dict(state)
+        for replicate_optimizer, state in zip(optimizers, checkpoint['optimizers']):
+            replicate_optimizer.load_state_dict(state)
         if config.schedule_lr:
-            scheduler.step([value for metric, value in val_metrics if metric == scheduling_metric][0])
-            if lr != optimizer.param_groups[0]['lr']:
-                logger.log(f"\tUpdated learning rate from {sci_notation(lr, decimals=6, strip=True)} to {sci_notation(optimizer.param_groups[0]['lr'], decimals=6, strip=True)}.", with_time=False)
-                lr = optimizer.param_groups[0]['lr']
+            for scheduler, state in zip(schedulers, checkpoint['schedulers']):
+                scheduler.load_state_dict(state)
+        lrs = [replicate_optimizer.param_groups[0]['lr'] for replicate_optimizer in optimizers]
+        for summary, best, statistics in zip(summaries, checkpoint['best'], checkpoint['statistics']):
+            summary.best, summary.statistics = best, statistics
+        best_states = checkpoint['best_states']
+        set_rng_states(checkpoint['rng_states'])
+        for logger in loggers:
+            logger.log(f'Resuming from the checkpoint at epoch {format_epoch(checkpoint["epoch"])}.\n', with_time=True)
+    epoch = start_epoch - 1
+
+    for epoch in tqdm(range(start_epoch, config.n_epochs+1), initial=start_epoch-1, total=config.n_epochs, disable=not progress):
+
+        for logger in loggers:
+            logger.log(f'Epoch {format_epoch(epoch)}', with_time=True)
+        train_metrics = dataset.train(model, optimizer)
+        if config.replicates == 1: train_metrics = [train_metrics]
+        for logger, summary, replicate_metrics in zip(loggers, summaries, train_metrics):
+            logger.log_metrics(replicate_metrics, prefix='\tTraining:'.ljust(13), with_time=False, epoch=epoch, split='Training')
+            summary.update_train(replicate_metrics)
+
+        if epoch == config.n_epochs or config.test_every > 0 and epoch % config.test_every == 0:
+
+            val_metrics, test_metrics = dataset.eval(model)
+            if config.replicates == 1: val_metrics, test_metrics = [val_metrics], [test_metrics]
+            for logger, replicate_metrics in zip(loggers, val_metrics):
+                logger.log_metrics(replicate_metrics, prefix='\tValidation:'.ljust(13), with_time=False, epoch=epoch, split='Validation')
+            for logger, replicate_metrics in zip(loggers, test_metrics):
+                logger.log_metrics(replicate_metrics, prefix='\tTesting:'.ljust(13), with_time=False, epoch=epoch, split='Testing')
+            for replicate, (summary, replicate_val_metrics, replicate_test_metrics) in enumerate(zip(summaries, val_metrics, test_metrics)):
+                summary.update(epoch, replicate_val_metrics, replicate_test_metrics)
+                if config.patience is not None and summary.best[scheduling_metric]['epoch'] == epoch:
+                    best_states[replicate] = {key: value.detach().clone() for key, value in models[replicate].state_dict().items()}
+
+            if config.schedule_lr:
+                for replicate, (logger, scheduler, replicate_optimizer) in enumerate(zip(loggers, schedulers, optimizers)):
+                    scheduler.step([value for metric, value in val_metrics[replicate] if metric == scheduling_metric][0])
+                    lr, new_lr = lrs[replicate], replicate_optimizer.param_groups[0]['lr']
+                    if lr != new_lr:
+                        logger.log(f"\tUpdated learning rate from {sci_notation(lr, decimals=6, strip=True)} to {sci_notation(new_lr, decimals=6, strip=True)}.", with_time=False)
+                        lrs[replicate] = new_lr
+
+        if isinstance(config.save_every, int) and (config.save_every > 0 and epoch % config.save_every == 0 or config.save_every == -1 and epoch == config.n_epochs):
+            for logger, replicate_model in zip(loggers, models):
+                ckpt_fn = f'{logger.exp_dir}/ckpt-{format_epoch(epoch)}.pt'
+                logger.log(f'\tSaving model at {ckpt_fn}.', with_time=False)
+                torch.save(replicate_model.state_dict(), ckpt_fn)
+
+        # stop once none of the replicates has improved in the last `patience` epochs
+        stop = config.patience is not None and all(
+            scheduling_metric in summary.best and epoch - summary.best[scheduling_metric]['epoch'] >= config.patience
+            for summary in summaries
+        )
+        for logger, summary in zip(loggers, summaries):
+            if stop:
+                logger.log(f"\tStopping early; best {scheduling_metric.lower()} at epoch {format_epoch(summary.best[scheduling_metric]['epoch'])}.", with_time=False)
+            logger.log('', with_time=False)
+            # write out the buffered logs once per epoch, rather than once per line
+            logger.flush()
+            summary.save(epoch)
+        if stop:
+            break
+
+        if isinstance(config.checkpoint_every, int) and config.checkpoint_every > 0 and epoch % config.checkpoint_every == 0:
+            save_checkpoint({
+                'epoch': epoch,
+                'models': [replicate_model.state_dict() for replicate_model in models],
+                'optimizers': [replicate_optimizer.state_dict() for replicate_optimizer in optimizers],
+                'schedulers': [scheduler.state_dict() for scheduler in schedulers] if config.schedule_lr else None,
+                'best': [summary.best for summary in summaries],
+                'statistics': [summary.statistics for summary in summaries],
+                'best_states': best_states,
+                'rng_states': get_rng_states(),
+                'split_permutations': dataset.permutations,
+                'dataset_rng_states': dataset_rng_states,
+                'log_offsets': [logger.tell() for logger in loggers],
+            }, resume_fn)
+
+    for logger, summary, best_state in zip(loggers, summaries, best_states):
+        if best_state is not None:
+            ckpt_fn = f'{logger.exp_dir}/ckpt-best.pt'
+            logger.log(f'Saving best model at {ckpt_fn}.', with_time=False)
+            torch.save(best_state, ckpt_fn)
+        summary.save(epoch, complete=True)
+        logger.close()
+
 
-    if isinstance(config.save_every, int) and (config.save_every > 0 and epoch % config.save_every == 0 or config.save_every == -1 and epoch == config.n_epochs):
-        ckpt_fn = f'{logger.exp_dir}/ckpt-{format_epoch(epoch)}.pt'
-        logger.log(f'\tSaving model at {ckpt_fn}.', with_time=False)
-        torch.save(model.state_dict(), ckpt_fn) 
+if __name__ == '__main__':
 
-    logger.log('', with_time=False)
\ No newline at end of file
+    config, others = parse_arguments(return_others=True)
+    run(config, others)
\ No newline at end of file
@@ -1,3 +1,4 @@
 from metrics.base import Metrics
 from metrics.classification import Classification
-from metrics.regression import Regression
\ No newline at end of file
+from metrics.regression import Regression
+from metrics.replicates import ReplicateMetrics
\ No newline at end of file
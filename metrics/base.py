@@ -1,3 +1,6 @@
+from typing import Dict
+
+import torch
 from torch import Tensor
 
 
@@ -5,7 +8,32 @@ class Metrics:
 
     def __init__(self):
 
-        pass
+        self.running_sums = dict()
+
+    def accumulate(self, **batch_sums: Tensor):
+
+        '''
+        Add the batch sums to the running sums. The running sums are kept on the device,
+        so that accumulating them does not synchronize with the host on every batch.
+        '''
+
+        for key, value in batch_sums.items():
+            value = value.detach()
+            self.running_sums[key] = self.running_sums[key] + value if key in self.running_sums else value
+
+    def materialize(self) -> Dict[str, float]:
+
+        '''
+        Move the running sums to the host -- all at once, with a single synchronization.
+        '''
+
+        if not self.running_sums:
+            return dict()
+        
+        keys = list(self.running_sums.keys())
+        values = torch.stack([self.running_sums[key] for key in keys]).tolist()
+
+        return dict(zip(keys, values))
 
     def reset(self):
 
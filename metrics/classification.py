@@ -1,45 +1,79 @@
 import torch
 from torch import Tensor
 from torch.nn import BCEWithLogitsLoss, CrossEntropyLoss
-from torchmetrics.classification import BinaryAccuracy, BinaryF1Score, BinaryAUROC, \
-    MulticlassAccuracy, MulticlassF1Score, MulticlassAUROC
+from torch.nn.functional import one_hot
 
 from metrics.base import Metrics
 
 
+# Number of equal-width bins over [0, 1] of the score histograms used for AU-ROC
+N_BINS = 10_000
+
+
 class Classification(Metrics):
 
     def __init__(self, num_classes: int, device: torch.device):
 
+        '''
+        Accuracy, F1 score and AU-ROC are derived from a confusion matrix and a histogram of the
+        predicted scores, which are updated in place on every batch. The memory used is constant
+        with respect to the dataset size, and no predictions are stored.
+
+        The metrics follow torchmetrics' defaults: thresholding at 0.5 for binary classification,
+        and macro-averaging over classes (that appear in the targets or predictions) otherwise.
+        AU-ROC is computed over the binned scores, so scores in the same bin count as ties.
+        '''
+
         super(Classification, self).__init__()
 
         if not isinstance(num_classes, int):
             raise TypeError(f'Expected `num_classes` to be an instance of `int` (got {type(num_classes)}).')
-        
+
         if num_classes == 2:
             self.nonlinearity = torch.sigmoid
             self.loss_fn = lambda input, target: BCEWithLogitsLoss(reduction='sum')(input, target.float())
-            self.accuracy_fn = BinaryAccuracy().to(device)
-            self.f1score_fn = BinaryF1Score().to(device)
-            self.auroc_fn = BinaryAUROC().to(device)
+            self.n_scores = 1   # score of the positive class
         elif num_classes > 2:
             self.nonlinearity = lambda probs: torch.softmax(probs, dim=-1)
             self.loss_fn = CrossEntropyLoss(reduction='sum')
-            self.accuracy_fn = MulticlassAccuracy(num_classes).to(device)
-            self.f1score_fn = MulticlassF1Score(num_classes).to(device)
-            self.auroc_fn = MulticlassAUROC(num_classes).to(device)
+            self.n_scores = num_classes
         else:
             raise ValueError(f'Expected `num_classes` to be >1 (got {num_classes}).')
-        
+
+        self.num_classes = num_classes
+        self.device = device
         self.reset()
-        
+
     def reset(self):
 
-        self.n_samples = self.total_ce_loss = 0
-        self.accuracy_fn.reset()
-        self.f1score_fn.reset()
-        self.auroc_fn.reset()
-    
+        self.n_samples = 0
+        self.running_sums = dict()
+        # flattened (true class, predicted class)
+        self.confusion_matrix = torch.zeros(self.num_classes**2, dtype=torch.long, device=self.device)
+        # flattened (class, negative/positive, bin)
+        self.score_histogram = torch.zeros(self.n_scores*2*N_BINS, dtype=torch.long, device=self.device)
+
+    def update(self, preds: Tensor, target: Tensor):
+
+        if self.num_classes == 2:
+            pred_classes = (preds > 0.5).long()
+            scores, positives = preds.unsqueeze(-1), target.unsqueeze(-1).long()
+        else:
+            pred_classes = preds.argmax(dim=-1)
+            scores, positives = preds, one_hot(target, self.num_classes)
+
+        self.confusion_matrix.index_add_(
+            0, target*self.num_classes + pred_classes,
+            torch.ones_like(pred_classes),
+        )
+
+        bins = (scores * N_BINS).long().clamp(max=N_BINS-1)
+        classes = torch.arange(self.n_scores, device=scores.device)
+        self.score_histogram.index_add_(
+            0, ((2*classes + positives) * N_BINS + bins).flatten(),
+            torch.ones_like(bins).flatten(),
+        )
+
     def compute_loss(self, input: Tensor, target: Tensor):
 
         # squeeze to make the input compatible for BCE loss
@@ -47,24 +81,58 @@ class Classification(Metrics):
 
         # loss expects logits, but not probabilities
         batch_ce_loss = self.loss_fn(input, target)
-        self.total_ce_loss += batch_ce_loss.item()
+        self.accumulate(ce_loss=batch_ce_loss)
         self.n_samples += target.size(0)
 
         # other metrics expect (rather, can work with) probabilities, but not logits
-        preds = self.nonlinearity(input)
-
-        self.accuracy_fn.update(preds, target)
-        self.f1score_fn.update(preds, target)
-        self.auroc_fn.update(preds, target)
+        with torch.no_grad():
+            self.update(self.nonlinearity(input), target)
 
         return batch_ce_loss / target.size(0)
 
+    def compute_accuracy_and_f1(self, confusion_matrix: Tensor):
+
+        tp = confusion_matrix.diagonal()
+        fp = confusion_matrix.sum(dim=0) - tp
+        fn = confusion_matrix.sum(dim=1) - tp
+
+        if self.num_classes == 2:
+            accuracy = tp.sum() / confusion_matrix.sum()
+            f1_score = 2*tp[1] / (2*tp[1]+fp[1]+fn[1]) if tp[1]+fp[1]+fn[1] > 0 else torch.tensor(0.)
+            return accuracy.item(), f1_score.item()
+
+        # macro-average over the classes that appear in the targets or the predictions
+        present = tp+fp+fn > 0
+        recall = tp / (tp+fn).clamp(min=1)
+        f1_score = 2*tp / (2*tp+fp+fn).clamp(min=1)
+        accuracy = recall[present].mean() if present.any() else torch.tensor(0.)
+        f1_score = f1_score[present].mean() if present.any() else torch.tensor(0.)
+
+        return accuracy.item(), f1_score.item()
+
+    def compute_auroc(self, score_histogram: Tensor):
+
+        negatives, positives = score_histogram.unbind(dim=1)    # (classes, bins) each
+        n_negatives, n_positives = negatives.sum(dim=-1), positives.sum(dim=-1)
+
+        # probability that a positive scores higher than a negative, counting ties (same bin) as half
+        negatives_below = negatives.cumsum(dim=-1) - negatives
+        auroc = (positives * (negatives_below + 0.5*negatives)).sum(dim=-1) / (n_positives*n_negatives)
+
+        # one-vs-rest, macro-averaged over the classes -- scoring 0 for those without positives
+        # or negatives, like torchmetrics does
+        valid = (n_positives > 0) & (n_negatives > 0)
+        auroc = torch.where(valid, auroc, 0.).mean()
+
+        return auroc.item()
+
     def aggregate_metrics(self):
 
-        cross_entropy = self.total_ce_loss / self.n_samples
-        accuracy = self.accuracy_fn.compute().item()
-        f1_score = self.f1score_fn.compute().item()
-        auroc = self.auroc_fn.compute().item()
+        cross_entropy = self.materialize()['ce_loss'] / self.n_samples
+        confusion_matrix = self.confusion_matrix.cpu().double().view(self.num_classes, self.num_classes)
+        score_histogram = self.score_histogram.cpu().double().view(self.n_scores, 2, N_BINS)
+        accuracy, f1_score = self.compute_accuracy_and_f1(confusion_matrix)
+        auroc = self.compute_auroc(score_histogram)
 
         self.reset()
 
@@ -1,8 +1,11 @@
 from torch import Tensor, device
-from torchmetrics import MeanAbsoluteError, MeanAbsolutePercentageError, MeanSquaredError
 from metrics.base import Metrics
 
 
+# Same as torchmetrics.MeanAbsolutePercentageError, to avoid dividing by zero
+EPSILON = 1.17e-06
+
+
 class Regression(Metrics):
 
     def __init__(self, num_classes: int, device: device):
@@ -13,31 +16,34 @@ class Regression(Metrics):
 
         super(Regression, self).__init__()
 
-        self.mean_absolute_error = MeanAbsoluteError().to(device)
-        self.mean_absolute_percentage_error = MeanAbsolutePercentageError().to(device)
-        self.mean_squared_error = MeanSquaredError().to(device)
+        self.reset()
 
     def reset(self):
 
-        self.mean_absolute_error.reset()
-        self.mean_absolute_percentage_error.reset()
-        self.mean_squared_error.reset()
+        self.n_obs = 0
+        self.running_sums = dict()
     
     def compute_loss(self, input: Tensor, target: Tensor):
 
         input = input.reshape(target.shape)
         
-        mse = self.mean_squared_error.forward(input, target)
-        self.mean_absolute_error.update(input, target)
-        self.mean_absolute_percentage_error.update(input, target)
-
-        return mse
+        error = input - target
+        squared_error = error.square().sum()
+        self.accumulate(
+            squared_error=squared_error,
+            absolute_error=error.abs().sum(),
+            absolute_percentage_error=(error.abs() / target.abs().clamp(min=EPSILON)).sum(),
+        )
+        self.n_obs += target.numel()
+
+        return squared_error / target.numel()
     
     def aggregate_metrics(self):
 
-        mean_sq_error = self.mean_squared_error.compute().item()
-        mean_abs_error = self.mean_absolute_error.compute().item()
-        mean_abs_perc_error = self.mean_absolute_percentage_error.compute().item()
+        running_sums = self.materialize()
+        mean_sq_error = running_sums['squared_error'] / self.n_obs
+        mean_abs_error = running_sums['absolute_error'] / self.n_obs
+        mean_abs_perc_error = running_sums['absolute_percentage_error'] / self.n_obs
 
         self.reset()
 
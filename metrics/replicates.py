@@ -0,0 +1,40 @@
+from copy import deepcopy
+
+from torch import Tensor
+from metrics.base import Metrics
+
+
+class ReplicateMetrics(Metrics):
+
+    def __init__(self, metrics: Metrics, n_replicates: int):
+
+        '''
+        Keep a separate copy of `metrics` for each replicate of the model.
+
+        Args:
+            metrics: metrics for a single replicate, copied for the others.
+            n_replicates: number of replicates.
+        '''
+
+        super(ReplicateMetrics, self).__init__()
+
+        self.replicates = [metrics] + [deepcopy(metrics) for _ in range(n_replicates-1)]
+
+    def reset(self):
+
+        for metrics in self.replicates:
+            metrics.reset()
+
+    def compute_loss(self, input: Tensor, target: Tensor):
+
+        # the replicates share no parameters, so the gradient of the summed loss
+        # wrt each replicate's parameters is the gradient of that replicate's loss
+        loss = 0.
+        for metrics, replicate_input in zip(self.replicates, input):
+            loss = loss + metrics.compute_loss(replicate_input, target)
+
+        return loss
+
+    def aggregate_metrics(self):
+
+        return [metrics.aggregate_metrics() for metrics in self.replicates]
\ No newline at end of file
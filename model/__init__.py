@@ -36,6 +36,9 @@ class Model(Module):
                 bias=config.bias,
                 others=others,
             ))
+        # the layers treat the adjacency matrix alike, so they share the pretreatment (and its cache)
+        for mp_layer in self.message_passing[1:]:
+            mp_layer.pt = self.message_passing[0].pt
 
         ffn_head = get_readout(others.task_name)
         ffn_layer_sizes = config.gnn_layer_sizes[-1:] + config.ffn_layer_sizes + [others.output_dim]
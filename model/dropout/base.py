@@ -40,7 +40,35 @@ class BaseDropout(nn.Module):
             edge_index (Adj): adjacency matrix, eg. shape (2, |E|)
         '''
 
+        edge_mask = self.edge_mask(edge_index, training)
+        if edge_mask is None:
+            return edge_index, edge_attr
+
+        edge_index = edge_index[:, edge_mask]
+        edge_attr = edge_attr[edge_mask] if edge_attr is not None else None
+
         return edge_index, edge_attr
+
+    def edge_mask(self, edge_index, training=True):
+
+        '''
+        Mask of the edges kept by `apply_adj_mat`, or None if it keeps all of them. Either boolean (|E|,), or the
+        positions of the kept edges in increasing order, eg. when only a few are kept (see masks.bernoulli_positions).
+
+        Args:
+            edge_index (Adj): adjacency matrix, eg. shape (2, |E|)
+        '''
+
+        return None
+
+    def keeps_adj_mat(self, training=True):
+
+        '''
+        Whether `apply_adj_mat` returns the adjacency matrix as it is, in which case whatever is computed
+        from it, eg. the normalized edge weights, can be computed once and reused.
+        '''
+
+        return True
     
     def apply_message_mat(self, messages, training=True):
 
@@ -52,4 +80,13 @@ class BaseDropout(nn.Module):
             messages (Tensor): message matrix, eg. shape (|E|, H_{i+1})
         '''
 
-        return messages
\ No newline at end of file
+        return messages
+
+    def keeps_message_mat(self, training=True):
+
+        '''
+        Whether `apply_message_mat` returns the messages as they are, in which case they need not be
+        materialized, eg. when aggregating them with a sparse-dense matmul.
+        '''
+
+        return True
\ No newline at end of file
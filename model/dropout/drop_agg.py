@@ -1,6 +1,7 @@
 from typing import Optional
 from argparse import Namespace
 import torch
+from model.dropout import masks
 from torch_geometric.utils.num_nodes import maybe_num_nodes
 from model.dropout.base import BaseDropout
 
@@ -10,6 +11,8 @@ class DropAgg(BaseDropout):
     def __init__(self, dropout_prob: float = 0.5, others: Optional[Namespace] = None):
 
         super(DropAgg, self).__init__(dropout_prob)
+
+        self.packed_masks = bool(getattr(others, 'packed_masks', False))
     
     def apply_feature_mat(self, x, training=True):
 
@@ -17,20 +20,28 @@ class DropAgg(BaseDropout):
     
     def apply_adj_mat(self, edge_index, edge_attr=None, training=True):
 
+        return super(DropAgg, self).apply_adj_mat(edge_index, edge_attr, training)
+
+    def edge_mask(self, edge_index, training=True):
+
         if not training or self.dropout_prob == 0.0:
-            return edge_index, edge_attr
+            return None
 
         num_nodes = maybe_num_nodes(edge_index)
-        unif_samples = torch.rand(num_nodes, device=edge_index.device)
-        node_mask = unif_samples > self.dropout_prob
+        if self.packed_masks:
+            node_mask = masks.bernoulli_mask(num_nodes, 1-self.dropout_prob, device=edge_index.device)
+        else:
+            unif_samples = torch.rand(num_nodes, device=edge_index.device)
+            node_mask = unif_samples > self.dropout_prob
 
         # the edges (i, j) imply a directed edge i -> j
         edge_mask = node_mask[edge_index[1]]
-        edge_index = edge_index[:, edge_mask]
-        if edge_attr is not None:
-            edge_attr = edge_attr[edge_mask]
 
-        return edge_index, edge_attr
+        return edge_mask
+    
+    def keeps_adj_mat(self, training=True):
+
+        return not training or self.dropout_prob == 0.0
     
     def apply_message_mat(self, messages, training=True):
 
@@ -1,6 +1,7 @@
 from typing import Optional
 from argparse import Namespace
-from torch_geometric.utils import dropout_edge
+import torch
+from model.dropout import masks
 from model.dropout.base import BaseDropout
 
 
@@ -9,6 +10,9 @@ class DropEdge(BaseDropout):
     def __init__(self, dropout_prob: float = 0.5, others: Optional[Namespace] = None):
 
         super(DropEdge, self).__init__(dropout_prob)
+
+        self.packed_masks = bool(getattr(others, 'packed_masks', False))
+        self.skip_sampling = bool(getattr(others, 'skip_sampling', False))
     
     def apply_feature_mat(self, x, training=True):
 
@@ -16,10 +20,29 @@ class DropEdge(BaseDropout):
     
     def apply_adj_mat(self, edge_index, edge_attr=None, training=True):
 
-        edge_index, edge_mask = dropout_edge(edge_index, p=self.dropout_prob, training=training)
-        edge_attr = edge_attr[edge_mask] if edge_attr is not None else None
+        return super(DropEdge, self).apply_adj_mat(edge_index, edge_attr, training)
+
+    def edge_mask(self, edge_index, training=True):
+
+        if not training or self.dropout_prob == 0.0:
+            return None
+
+        if self.skip_sampling and 1-self.dropout_prob <= masks.MAX_SKIP_KEEP_PROB:
+            # only the positions of the kept edges are drawn
+            return masks.bernoulli_positions(edge_index.size(1), 1-self.dropout_prob, device=edge_index.device)
+
+        if self.packed_masks:
+            return masks.bernoulli_mask(edge_index.size(1), 1-self.dropout_prob, device=edge_index.device)
+
+        # same draws as torch_geometric.utils.dropout_edge
+        unif_samples = torch.rand(edge_index.size(1), device=edge_index.device)
+        edge_mask = unif_samples >= self.dropout_prob
+
+        return edge_mask
+    
+    def keeps_adj_mat(self, training=True):
 
-        return edge_index, edge_attr
+        return not training or self.dropout_prob == 0.0
     
     def apply_message_mat(self, messages, training=True):
 
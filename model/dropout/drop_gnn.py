@@ -1,6 +1,7 @@
 from typing import Optional
 from argparse import Namespace
-from torch_geometric.utils import dropout_node
+import torch
+from torch_geometric.utils.num_nodes import maybe_num_nodes
 from model.dropout.base import BaseDropout
 
 
@@ -16,10 +17,24 @@ class DropGNN(BaseDropout):
     
     def apply_adj_mat(self, edge_index, edge_attr=None, training=True):
         
-        edge_index, edge_mask, _ = dropout_node(edge_index, p=self.dropout_prob, training=training)
-        edge_attr = edge_attr[edge_mask] if edge_attr is not None else None
+        return super(DropGNN, self).apply_adj_mat(edge_index, edge_attr, training)
 
-        return edge_index, edge_attr
+    def edge_mask(self, edge_index, training=True):
+
+        if not training or self.dropout_prob == 0.0:
+            return None
+
+        # same draws as torch_geometric.utils.dropout_node, which keeps the edges between the kept nodes
+        num_nodes = maybe_num_nodes(edge_index)
+        unif_samples = torch.rand(num_nodes, device=edge_index.device)
+        node_mask = unif_samples > self.dropout_prob
+        edge_mask = node_mask[edge_index[0]] & node_mask[edge_index[1]]
+
+        return edge_mask
+    
+    def keeps_adj_mat(self, training=True):
+
+        return not training or self.dropout_prob == 0.0
     
     def apply_message_mat(self, messages, training=True):
 
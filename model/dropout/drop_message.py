@@ -1,6 +1,7 @@
 from typing import Optional
 from argparse import Namespace
 from torch.nn.functional import dropout
+from model.dropout import masks
 from model.dropout.base import BaseDropout
 
 
@@ -9,6 +10,8 @@ class DropMessage(BaseDropout):
     def __init__(self, dropout_prob: float = 0.5, others: Optional[Namespace] = None):
 
         super(DropMessage, self).__init__(dropout_prob)
+
+        self.packed_masks = bool(getattr(others, 'packed_masks', False))
     
     def apply_feature_mat(self, x, training=True):
 
@@ -20,4 +23,11 @@ class DropMessage(BaseDropout):
     
     def apply_message_mat(self, messages, training=True):
         
-        return dropout(messages, self.dropout_prob, training=training)
\ No newline at end of file
+        if self.packed_masks:
+            return masks.dropout(messages, self.dropout_prob, training=training)
+        
+        return dropout(messages, self.dropout_prob, training=training)
+    
+    def keeps_message_mat(self, training=True):
+
+        return not training or self.dropout_prob == 0.0
\ No newline at end of file
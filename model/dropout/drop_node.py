@@ -1,6 +1,7 @@
 from typing import Optional
 from argparse import Namespace
 import torch
+from model.dropout import masks
 from model.dropout.base import BaseDropout
 
 
@@ -9,12 +10,18 @@ class DropNode(BaseDropout):
     def __init__(self, dropout_prob: float = 0.5, others: Optional[Namespace] = None):
 
         super(DropNode, self).__init__(dropout_prob)
+
+        self.packed_masks = bool(getattr(others, 'packed_masks', False))
     
     def apply_feature_mat(self, x, training=True):
 
         if not training or self.dropout_prob == 0.0:
             return x
         
+        if self.packed_masks:
+            node_mask = masks.bernoulli_mask(x.size(0), 1-self.dropout_prob, device=x.device)
+            return masks.masked_scale(x, node_mask.unsqueeze(1), 1/(1-self.dropout_prob))
+
         unif_samples = torch.rand(x.size(0), 1, device=x.device)
         node_mask = unif_samples > self.dropout_prob
 
@@ -1,15 +1,66 @@
 from typing import Optional
 from argparse import Namespace
+import os
 import warnings
 
-import numpy as np
-import sympy
-from sympy.abc import x
 import torch
 from torch_geometric.utils import degree, contains_self_loops
+from model.dropout import masks
 from model.dropout.base import BaseDropout
 
 
+# Tables of q for each info_loss_ratio, shared by the layers (and models) in the process, and cached on disk
+# under `dataset.cache.cache_root`
+_tables = dict()
+# Largest degree to look for the degree beyond which q is capped at the maximum dropping probability
+MAX_DEGREE = 2**16
+
+
+def solve_drop_probs(c: float, size: int, n_iters: int = 64):
+
+    '''
+    q for all degrees d in [0, size), where q is the second largest real root of d*(1-c)*(1-x) - x + x**(d+1).
+    The polynomial factorizes as (1-x) * (d*(1-c) - sum_{k=1}^{d} x**k), so q is the root in [0, 1] of the
+    second factor, which decreases monotonically over [0, 1], and is found by bisection for all degrees at once.
+    '''
+
+    d = torch.arange(size, dtype=torch.float64)
+    lo, hi = torch.zeros(size, dtype=torch.float64), torch.ones(size, dtype=torch.float64)
+    for _ in range(n_iters):
+        q = (lo+hi) / 2
+        # sum_{k=1}^{d} q**k, which is nan (and so not below d*(1-c)) for q = 1
+        below = q * (1-q**d) / (1-q) < d*(1-c)
+        lo, hi = torch.where(below, q, lo), torch.where(below, hi, q)
+
+    return lo.float()
+
+def load_drop_probs(c: float, size: int):
+
+    '''
+    q for all degrees d in [0, size), from the table of `c`, which is extended (to a power of 2) and saved
+    whenever it is too small.
+    '''
+
+    # imported here, since the dataset package imports the models
+    from dataset.cache import cache_root
+
+    c = float(c)
+    if c not in _tables or _tables[c].size(0) < size:
+        tables_dir = f'{cache_root}/DropSens'
+        fn = f'{tables_dir}/c={c}.pt'
+        table = torch.load(fn, weights_only=True) if os.path.isfile(fn) else torch.zeros(0)
+        if table.size(0) < size:
+            table = solve_drop_probs(c, max(64, 1 << (size-1).bit_length()))
+            os.makedirs(tables_dir, exist_ok=True)
+            # write to a temporary file first, since other processes may be reading or writing the same table
+            tmp_fn = f'{fn}.{os.getpid()}.tmp'
+            torch.save(table, tmp_fn)
+            os.replace(tmp_fn, fn)
+        _tables[c] = table
+
+    return _tables[c][:size]
+
+
 class DropSens(BaseDropout):
 
     def __init__(self, dropout_prob: float = 0.5, others: Optional[Namespace] = None):
@@ -21,6 +72,12 @@ class DropSens(BaseDropout):
         super(DropSens, self).__init__(dropout_prob)    # Maximum value q_i can take
         self.c = others.info_loss_ratio
         self.node_level_task = others.task_name.lower().startswith('node')
+        # Per-edge q can be reused across forward passes only if the graph is fixed
+        self.cache_qs = bool(getattr(others, 'cache_qs', False))
+        if self.cache_qs and not self.node_level_task:
+            raise ValueError('Caching the per-edge dropping probabilities in DropSens requires a node-level task.')
+        self.qs = None
+        self.skip_sampling = bool(getattr(others, 'skip_sampling', False))
 
     def init_mapper(self, edge_index):
 
@@ -30,43 +87,27 @@ class DropSens(BaseDropout):
                 but the edge_index received has them.')
         degrees = degree(edge_index[1]).int()       # Node index -> node degree
 
-        if self.node_level_task:
-            # If node level task, compute mapper *once*, only for the valid degrees, 
-            # since they won't change in each run
-            ds = torch.unique(degrees).tolist()             # Sorted array
-            self.mapper = torch.nan * torch.ones(ds[-1]+1)  # torch.nan where index is not in ds
-            self.mapper[ds] = self.dropout_prob             # Reset some of the dropping probabilities below
-        else:
-            # If graph level task, compute mapper for all d upto max(unique_degrees), 
-            # because degrees will change in each run
-            ds = range(0, degrees.max().item()+1)
-            self.mapper = self.dropout_prob * torch.ones(ds[-1]+1)
-        
-        for d in ds:
-            q = float(sympy.N(sympy.real_roots(d*(1-self.c)*(1-x)-x+x**(d+1))[-2])) if d>0 else 0.
-            if q > self.dropout_prob:
-                break   # Because q monontonic wrt d, and unique_degrees is sorted
-            self.mapper[d] = q
+        # Compute mapper for all d upto max(degrees), capping q at the maximum dropping probability
+        size = degrees.max().item()+1
+        mapper = load_drop_probs(self.c, size)
+        # q is monotonic wrt d, so once capped, it is capped for all larger d -- extend the mapper upto
+        #   that degree, so that larger degrees can be clamped to it instead of updating the mapper
+        while mapper[-1] < self.dropout_prob and size < MAX_DEGREE:
+            size = min(2*size, MAX_DEGREE)
+            mapper = load_drop_probs(self.c, size)
+        if mapper[-1] >= self.dropout_prob:
+            mapper = mapper[:(mapper >= self.dropout_prob).nonzero()[0].item()+1]
+        self.saturated = mapper[-1].item() >= self.dropout_prob
+        self.mapper = mapper.clamp(max=self.dropout_prob).to(edge_index.device)
 
     def update_mapper(self, degrees):
 
-        # If q has been computed for all degrees, simply return 
-        if degrees.max().item() < self.mapper.size(0):
+        # If q has been computed for all degrees (or is capped beyond the mapper), simply return 
+        if self.saturated or degrees.max().item() < self.mapper.size(0):
             return
 
-        # Set max dropping probability for d for which q was not computed before
-        ds = range(len(self.mapper), degrees.max().item()+1)
-        self.mapper = torch.cat((self.mapper, self.dropout_prob*torch.ones(len(ds))))
-        
-        # If q had already been maxed out, no need to compute even once
-        if self.mapper[ds[0]-1] == self.dropout_prob:
-            return
-        
-        for d in ds:
-            q = float(sympy.N(sympy.real_roots(d*(1-self.c)*(1-x)-x+x**(d+1))[-2])) if d>0 else 0.
-            # Because q monontonic wrt d, and unique_degrees is sorted
-            if q > self.dropout_prob: break
-            self.mapper[d] = q
+        # If graph level task, degrees will change in each run, so extend the mapper to the new max degree
+        self.mapper = load_drop_probs(self.c, degrees.max().item()+1).clamp(max=self.dropout_prob).to(degrees.device)
 
     def apply_feature_mat(self, x, training=True):
 
@@ -74,25 +115,46 @@ class DropSens(BaseDropout):
     
     def apply_adj_mat(self, edge_index, edge_attr=None, training=True):
 
-        if not training or self.dropout_prob == 0.0:
-            return edge_index, edge_attr
+        return super(DropSens, self).apply_adj_mat(edge_index, edge_attr, training)
 
-        degrees = degree(edge_index[1]).int()
-        if not hasattr(self, 'mapper'):
-            self.init_mapper(edge_index)
-        elif not self.node_level_task:
-            self.update_mapper(degrees)
+    def edge_mask(self, edge_index, training=True):
 
-        # degrees[edge_index[1]]: i -> d_i
-        # self.mapper[degrees[edge_index[1]]]: (i -> d_i) -> q_i
-        qs = self.mapper[degrees[edge_index[1]].to('cpu')]
-        edge_mask = qs <= torch.rand(edge_index.size(1))
-        edge_mask = edge_mask.to(edge_index.device)
+        if not training or self.dropout_prob == 0.0:
+            return None
 
-        edge_index = edge_index[:, edge_mask]
-        edge_attr = edge_attr[edge_mask] if edge_attr is not None else None
+        if self.cache_qs and self.qs is not None and self.qs.size(0) == edge_index.size(1) and self.qs.device == edge_index.device:
+            qs = self.qs
+        else:
+            degrees = degree(edge_index[1], dtype=torch.long)
+            if not hasattr(self, 'mapper'):
+                self.init_mapper(edge_index)
+            elif not self.node_level_task:
+                self.update_mapper(degrees)
+            if self.mapper.device != edge_index.device:
+                self.mapper = self.mapper.to(edge_index.device)
+            # self.mapper[degrees]: i -> d_i -> q_i, clamping the degrees beyond which q is capped
+            # self.mapper[degrees][edge_index[1]]: (j, i) -> q_i
+            qs = self.mapper[degrees.clamp(max=self.mapper.size(0)-1)][edge_index[1]]
+            if self.cache_qs:
+                self.qs = qs
+
+        if self.skip_sampling and qs.size(0) > 0:
+            # An edge is kept with probability 1-q_i <= 1-min(q), ie. proposed with probability 1-min(q), and then
+            #     accepted with probability (1-q_i)/(1-min(q)), drawing only the positions of the proposed edges
+            max_keep_prob = 1 - qs.min().item()
+            if max_keep_prob <= masks.MAX_SKIP_KEEP_PROB:
+                positions = masks.bernoulli_positions(edge_index.size(1), max_keep_prob, device=edge_index.device)
+                unif_samples = torch.rand(positions.size(0), device=edge_index.device)
+                return positions[unif_samples * max_keep_prob < 1 - qs[positions]]
+
+        # Sample on the device of the graph, without copying to or from the host
+        edge_mask = qs <= torch.rand(edge_index.size(1), device=edge_index.device)
+
+        return edge_mask
+    
+    def keeps_adj_mat(self, training=True):
 
-        return edge_index, edge_attr
+        return not training or self.dropout_prob == 0.0
     
     def apply_message_mat(self, messages, training=True):
 
@@ -1,6 +1,7 @@
 from typing import Optional
 from argparse import Namespace
 from torch.nn.functional import dropout
+from model.dropout import masks
 from model.dropout.base import BaseDropout
 
 
@@ -10,8 +11,13 @@ class Dropout(BaseDropout):
 
         super(Dropout, self).__init__(dropout_prob)
 
+        self.packed_masks = bool(getattr(others, 'packed_masks', False))
+
     def apply_feature_mat(self, x, training=True):
         
+        if self.packed_masks:
+            return masks.dropout(x, self.dropout_prob, training=training)
+        
         return dropout(x, self.dropout_prob, training=training)
     
     def apply_adj_mat(self, edge_index, edge_attr=None, training=True):
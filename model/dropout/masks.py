@@ -0,0 +1,136 @@
+'''
+Bernoulli masks for the dropping methods, drawn from random integers, four 16-bit uniform samples per 64-bit one,
+instead of one float per entry, and applied with a scale-and-mask op that keeps only the mask, packed into bits,
+for backward, instead of a mask of the same size as its input.
+
+The probabilities are quantized to multiples of 1/2^16, and so the masks are distributed (almost, eg. up to
+7.6e-6 in the probability) like the ones of torch.rand or torch.nn.functional.dropout, but are not the same draws.
+
+When only a few entries are kept, eg. the edges at high dropping probabilities, the positions of the kept ones are
+drawn instead, as geometric gaps between them, in time proportional to their number rather than to the entries'.
+'''
+
+import math
+
+import torch
+
+
+RESOLUTION = 2**16
+# fraction of kept entries below which drawing the positions of the kept entries is cheaper than a mask of all
+# of them, since a geometric sample costs more than a uniform one
+MAX_SKIP_KEEP_PROB = 0.5
+
+
+def bernoulli_mask(num_samples: int, keep_prob: float, device=None):
+
+    '''
+    Mask of `num_samples` entries, each kept (True) with probability `keep_prob`.
+    '''
+
+    threshold = round(keep_prob * RESOLUTION)
+    if threshold >= RESOLUTION:
+        return torch.ones(num_samples, dtype=torch.bool, device=device)
+
+    # the bytes of the 64-bit integers, read as 16-bit integers, are uniform in [-2^15, 2^15)
+    samples = torch.randint(-2**63, 2**63-1, (-(-num_samples // 4),), dtype=torch.int64, device=device)
+    samples = samples.view(torch.int16)[:num_samples]
+
+    return samples < threshold - RESOLUTION//2
+
+def bernoulli_positions(num_samples: int, keep_prob: float, device=None):
+
+    '''
+    Positions, in increasing order, of the entries kept by a mask of `num_samples` entries, each kept with
+    probability `keep_prob`, ie. the successes of Bernoulli trials, which are separated by geometric gaps.
+    '''
+
+    if keep_prob >= 1.0:
+        return torch.arange(num_samples, device=device)
+    if keep_prob <= 0.0 or num_samples == 0:
+        return torch.empty(0, dtype=torch.long, device=device)
+
+    positions, last = list(), -1
+    while True:
+        # enough gaps to reach the end with high probability, drawing more only if they do not
+        expected = (num_samples-1-last) * keep_prob
+        # inverse transform sampling of the gaps, with log(1-u) in (-inf, 0], a few times cheaper than geometric_
+        gaps = torch.rand(int(expected + 4*expected**0.5) + 16, device=device).neg_().log1p_()
+        gaps = gaps.div_(math.log1p(-keep_prob)).floor_().clamp_(max=num_samples).long() + 1
+        ends = last + gaps.cumsum(dim=0)
+        positions.append(ends[ends < num_samples])
+        last = ends[-1].item()
+        if last >= num_samples:
+            return torch.cat(positions)
+
+def pack_mask(mask):
+
+    '''
+    Pack a mask into bits, 8 entries per byte.
+    '''
+
+    mask = mask.flatten().to(torch.uint8)
+    mask = torch.cat((mask, mask.new_zeros(-mask.size(0) % 8)))
+    bits = torch.arange(8, dtype=torch.uint8, device=mask.device)
+
+    return (mask.view(-1, 8) << bits).sum(dim=1, dtype=torch.uint8)
+
+def unpack_mask(packed, shape):
+
+    '''
+    Unpack a mask of the given shape from its bits, as packed by `pack_mask`.
+    '''
+
+    bits = torch.arange(8, dtype=torch.uint8, device=packed.device)
+    mask = ((packed.unsqueeze(1) >> bits) & 1).flatten().bool()
+
+    return mask[:shape.numel()].view(shape)
+
+
+class MaskedScale(torch.autograd.Function):
+
+    # the mask is drawn per replicate when they are vectorized by vmap (see model.replicates)
+    generate_vmap_rule = True
+
+    @staticmethod
+    def forward(input, mask, scale):
+
+        return input * mask * scale
+
+    @staticmethod
+    def setup_context(ctx, inputs, output):
+
+        _, mask, scale = inputs
+        ctx.save_for_backward(pack_mask(mask))
+        ctx.shape, ctx.scale = mask.shape, scale
+
+    @staticmethod
+    def backward(ctx, grad_output):
+
+        packed, = ctx.saved_tensors
+        mask = unpack_mask(packed, ctx.shape)
+
+        return grad_output * mask * ctx.scale, None, None
+
+
+def masked_scale(input, mask, scale: float):
+
+    '''
+    Same as `input * mask * scale`, with the mask (broadcastable to the input) saved for backward as bits.
+    '''
+
+    return MaskedScale.apply(input, mask, scale)
+
+def dropout(input, p: float = 0.5, training: bool = True):
+
+    '''
+    Same as torch.nn.functional.dropout, with a mask drawn by `bernoulli_mask` and applied by `masked_scale`.
+    '''
+
+    if not training or p == 0.0:
+        return input
+    if p == 1.0:
+        return input * 0.0
+
+    mask = bernoulli_mask(input.numel(), 1-p, device=input.device).view(input.shape)
+
+    return masked_scale(input, mask, 1/(1-p))
\ No newline at end of file
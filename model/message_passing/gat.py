@@ -1,10 +1,14 @@
 from typing import Optional
 from argparse import Namespace
+from bisect import bisect_right
 
+import torch
 from torch import Tensor
 from torch.nn import Module
 from torch.nn.functional import leaky_relu
-from torch_geometric.utils import softmax, remove_self_loops
+from torch.utils.checkpoint import checkpoint
+from torch_geometric import EdgeIndex
+from torch_geometric.utils import softmax, remove_self_loops, segment
 from torch_geometric.typing import Adj, OptTensor
 from torch_geometric.nn.conv import GATConv
 
@@ -40,6 +44,8 @@ class GATLayer(GATConv):
         self.pt = ModelPretreatment(add_self_loops, normalize)
         self.activation = activation
         self.drop_strategy = drop_strategy
+        self.segment_aggr = bool(getattr(others, 'segment_aggr', False))
+        self.chunk_size = getattr(others, 'attention_chunk_size', None)
 
     def feature_transformation(self, x):
 
@@ -49,17 +55,30 @@ class GATLayer(GATConv):
         return x
 
     def treat_adj_mat(self, edge_index, num_nodes, dtype):
+
+        # if nothing is dropped from the adjacency matrix, it is treated once per input graph,
+        # and reused by the other layers (sharing the pretreatment) and forward passes
+        if self.drop_strategy.keeps_adj_mat(self.training):
+            return self.pt.cached(self.compute_adj_mat, edge_index, num_nodes, dtype)
+
+        return self.compute_adj_mat(edge_index, num_nodes, dtype)
+
+    def compute_adj_mat(self, edge_index, num_nodes, dtype):
         
         if self.add_self_loops: # going to add self loops in pretreatment
             edge_index, _ = remove_self_loops(edge_index)
-        edge_index, _ = self.drop_strategy.apply_adj_mat(edge_index, None, self.training)
-        edge_index, edge_weight = self.pt.pretreatment(num_nodes, edge_index, dtype)
+        # the edges are dropped, the self loops added and the edges normalized in one pass
+        edge_mask = self.drop_strategy.edge_mask(edge_index, self.training)
+        edge_index, edge_weight = self.pt.masked_pretreatment(num_nodes, edge_index, edge_mask, dtype)
 
         return edge_index, edge_weight
 
     def message_passing(self, edge_index, x, alpha):
 
-        out = self.propagate(edge_index, x=x, alpha=alpha)
+        if self.chunk_size is not None:
+            out = self.chunked_message_passing(edge_index, x, alpha)
+        else:
+            out = self.propagate(edge_index, x=x, alpha=alpha)
         out = out.flatten(start_dim=1)  # concatenate heads
         
         return out
@@ -95,13 +114,77 @@ class GATLayer(GATConv):
 
         return out
 
-    def message(self, x_j: Tensor, alpha_j: Tensor, alpha_i: Tensor, index: Tensor, ptr: OptTensor, size_i: Optional[int]):
-        
+    def chunked_message_passing(self, edge_index, x, alpha):
+
+        '''
+        Same as `propagate`, with the attention coefficients of all the edges, (|E|, heads), computed at once, but
+        the messages, (|E|, heads, C), in chunks of `chunk_size` edges, each aggregated before the next is computed,
+        and recomputed in backward instead of saved, so that the memory of the messages is bounded by the chunk size.
+        The softmax is the exact one over all the edges, rather than an online (streaming) softmax over the chunks,
+        since the coefficients are only the size of a message's heads per edge, and so the results are the same.
+        The chunks of edges sorted by destination end at the last in-edge of a node, and are aggregated as segments.
+        '''
+
+        (x_src, x_dst), (alpha_src, alpha_dst) = x, alpha
+        num_nodes, num_edges = x_dst.size(0), edge_index.size(1)
+        ptr = None
+        if isinstance(edge_index, EdgeIndex):
+            # edges sorted by destination come with the pointer of the destinations (see ModelPretreatment)
+            ptr = edge_index.get_indptr() if edge_index.is_sorted_by_col else None
+            edge_index = edge_index.as_tensor()
+        row, col = edge_index
+
+        alpha = self.attention(alpha_src.index_select(0, row), alpha_dst.index_select(0, col), col, ptr, num_nodes)
+
+        if not (self.segment_aggr and ptr is not None):
+            out = x_dst.new_zeros(num_nodes, self.heads, self.out_channels)
+            for start in range(0, num_edges, self.chunk_size):
+                end = min(start+self.chunk_size, num_edges)
+                messages = checkpoint(self.chunk_message, x_src, alpha[start:end], row[start:end], use_reentrant=False)
+                out.index_add_(0, col[start:end], messages)
+            return out
+
+        outs, start_node, ptr_list = list(), 0, ptr.tolist()
+        while start_node < num_nodes:
+            # the most nodes whose in-edges fit in a chunk, and at least one
+            end_node = max(bisect_right(ptr_list, ptr_list[start_node]+self.chunk_size) - 1, start_node+1)
+            start, end = ptr_list[start_node], ptr_list[end_node]
+            messages = checkpoint(self.chunk_message, x_src, alpha[start:end], row[start:end], use_reentrant=False)
+            outs.append(segment(messages, ptr[start_node:end_node+1] - start, reduce='sum'))
+            start_node = end_node
+
+        return torch.cat(outs)
+
+    def chunk_message(self, x_src: Tensor, alpha: Tensor, row: Tensor):
+
+        return self.weight_messages(x_src.index_select(0, row), alpha)
+
+    def attention(self, alpha_j: Tensor, alpha_i: Tensor, index: Tensor, ptr: OptTensor, size_i: Optional[int]):
+
         alpha = alpha_j + alpha_i
         alpha = leaky_relu(alpha, self.negative_slope)
-        alpha = softmax(alpha, index, ptr, size_i)
-        
+        alpha = softmax(alpha, index, ptr if self.segment_aggr else None, size_i)
+
+        return alpha
+
+    def weight_messages(self, x_j: Tensor, alpha: Tensor):
+
         x_j = alpha.unsqueeze(-1) * x_j
         x_j = self.drop_strategy.apply_message_mat(x_j, self.training)
 
-        return x_j
\ No newline at end of file
+        return x_j
+
+    def message(self, x_j: Tensor, alpha_j: Tensor, alpha_i: Tensor, index: Tensor, ptr: OptTensor, size_i: Optional[int]):
+        
+        alpha = self.attention(alpha_j, alpha_i, index, ptr, size_i)
+        x_j = self.weight_messages(x_j, alpha)
+
+        return x_j
+
+    def aggregate(self, inputs: Tensor, index: Tensor, ptr: OptTensor = None, dim_size: Optional[int] = None):
+
+        # edges sorted by destination come with the pointer of the destinations (see ModelPretreatment)
+        if self.segment_aggr and ptr is not None:
+            return segment(inputs, ptr, reduce='sum')
+
+        return super(GATLayer, self).aggregate(inputs, index, ptr, dim_size)
\ No newline at end of file
@@ -5,7 +5,7 @@ from torch import Tensor
 from torch.nn import Module
 from torch_geometric.typing import Adj, OptTensor
 from torch_geometric.nn.conv import GCNConv
-from torch_geometric.utils import remove_self_loops
+from torch_geometric.utils import remove_self_loops, segment
 
 from model.dropout.base import BaseDropout
 from model.message_passing.pretreatment import ModelPretreatment
@@ -41,6 +41,8 @@ class GCNLayer(GCNConv):
         self.pt = ModelPretreatment(add_self_loops, normalize)
         self.activation = activation
         self.drop_strategy = drop_strategy
+        self.segment_aggr = bool(getattr(others, 'segment_aggr', False))
+        self.sparse_backend = bool(getattr(others, 'sparse_backend', False))
 
     def feature_transformation(self, x):
 
@@ -50,13 +52,57 @@ class GCNLayer(GCNConv):
         return x
     
     def treat_adj_mat(self, edge_index, num_nodes, dtype):
-        
+
+        # messages that are not dropped from need not be materialized, and can be aggregated by a sparse-dense matmul
+        if self.sparse_backend and self.drop_strategy.keeps_message_mat(self.training):
+            compute_adj_mat = self.compute_sparse_adj_mat
+        else:
+            compute_adj_mat = self.compute_adj_mat
+
+        # if nothing is dropped from the adjacency matrix, it is treated once per input graph,
+        # and reused by the other layers (sharing the pretreatment) and forward passes
+        if self.drop_strategy.keeps_adj_mat(self.training):
+            return self.pt.cached(compute_adj_mat, edge_index, num_nodes, dtype)
+
+        return compute_adj_mat(edge_index, num_nodes, dtype)
+
+    def strip_adj_mat(self, edge_index):
+
         if self.add_self_loops: # going to add self loops in pretreatment
             edge_index, _ = remove_self_loops(edge_index)
-        edge_index, _ = self.drop_strategy.apply_adj_mat(edge_index, None, self.training)
-        edge_index, edge_weight = self.pt.pretreatment(num_nodes, edge_index, dtype)
+
+        return edge_index
+
+    def compute_adj_mat(self, edge_index, num_nodes, dtype):
+        
+        edge_index = self.strip_adj_mat(edge_index)
+        # the edges are dropped, the self loops added and the edges normalized in one pass
+        edge_mask = self.drop_strategy.edge_mask(edge_index, self.training)
+        edge_index, edge_weight = self.pt.masked_pretreatment(num_nodes, edge_index, edge_mask, dtype)
 
         return edge_index, edge_weight
+
+    def sparse_layout(self, edge_index, num_nodes, dtype):
+
+        # the layout is the same whatever is dropped, so is computed once per input graph
+        edge_index = self.strip_adj_mat(edge_index)
+
+        return edge_index, self.pt.sparse_layout(edge_index, num_nodes)
+
+    def compute_sparse_adj_mat(self, edge_index, num_nodes, dtype):
+
+        '''
+        Same as `compute_adj_mat`, as a sparse CSR matrix (transposed, ie. with the in-edges of each node in its row),
+        with a fixed layout for the input graph, in which the edges dropped by the strategy are zeroed instead of
+        removed. The strategy draws the same random numbers either way, and so the results are the same.
+        '''
+
+        edge_index, layout = self.pt.cached(self.sparse_layout, edge_index, num_nodes, dtype)
+        edge_mask = self.drop_strategy.edge_mask(edge_index, self.training)
+        adj_t = self.pt.sparse_pretreatment(num_nodes, layout, edge_mask, dtype)
+
+        # propagate aggregates by GCNConv.message_and_aggregate, a sparse-dense matmul, without calling message
+        return adj_t, None
     
     def message_passing(self, edge_index, x, edge_weight):
 
@@ -94,4 +140,12 @@ class GCNLayer(GCNConv):
         # drop from message matrix -- drop message
         x_j = self.drop_strategy.apply_message_mat(x_j, self.training)
 
-        return x_j
\ No newline at end of file
+        return x_j
+
+    def aggregate(self, inputs: Tensor, index: Tensor, ptr: OptTensor = None, dim_size: Optional[int] = None):
+
+        # edges sorted by destination come with the pointer of the destinations (see ModelPretreatment)
+        if self.segment_aggr and ptr is not None:
+            return segment(inputs, ptr, reduce='sum')
+
+        return super(GCNLayer, self).aggregate(inputs, index, ptr, dim_size)
\ No newline at end of file
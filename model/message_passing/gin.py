@@ -56,14 +56,17 @@ class GINLayer(GCNLayer):
 
         self.eps.data.fill_(self.initial_eps)
     
+    def strip_adj_mat(self, edge_index):
+
+        # no self loops, no weight normalization => edge_weight = None
+        return remove_self_loops(edge_index)[0]
+    
     def forward(self, x: Tensor, edge_index: Adj):
 
         # FEATURE TRANSFORMATION
         x = self.feature_transformation(x)
-        # TREAT ADJACENCY MATRIX -- no self loops, no weight normalization => edge_weight = None
-        edge_index, edge_weight = self.treat_adj_mat(
-            remove_self_loops(edge_index)[0], num_nodes=x.size(0), dtype=x.dtype
-        )
+        # TREAT ADJACENCY MATRIX
+        edge_index, edge_weight = self.treat_adj_mat(edge_index, num_nodes=x.size(0), dtype=x.dtype)
         # MESSAGE PASSING
         out = self.message_passing(edge_index, x, edge_weight)
         out = out + (1+self.eps) * x
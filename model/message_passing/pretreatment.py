@@ -1,5 +1,41 @@
+import weakref
+
+import torch
+from torch_geometric import EdgeIndex
 from torch_geometric.typing import Adj
 from torch_geometric.utils import add_remaining_self_loops, degree
+from torch_geometric.utils.sparse import index2ptr
+
+
+def is_sorted_by_col(edge_index: Adj):
+
+    # eg. edges in the canonical form (see dataset.preprocess), possibly dropped from with a mask since
+    col = edge_index[1]
+    return bool((col[1:] >= col[:-1]).all())
+
+def add_sorted_self_loops(edge_index: Adj, num_nodes: int):
+
+    '''
+    Same as add_remaining_self_loops, for edges sorted by destination, which are kept sorted by placing the
+    self loop of each node after its other in-edges -- the order in which add_remaining_self_loops, which
+    appends the self loops at the end, has them aggregated.
+
+    Returns:
+        edge_index (Adj): edges with self loops, sorted by destination.
+        ptr (Tensor): pointer of the destinations, ie. the in-edges of node i are ptr[i]:ptr[i+1] (|V|+1,).
+    '''
+
+    edge_index = edge_index[:, edge_index[0] != edge_index[1]]
+    ptr = index2ptr(edge_index[1], num_nodes)
+    nodes = torch.arange(num_nodes+1, device=edge_index.device)
+
+    # an in-edge of node i comes after the self loops of nodes 0, ..., i-1,
+    # and the self loop of node i after the in-edges of nodes 0, ..., i
+    out = edge_index.new_empty(2, edge_index.size(1)+num_nodes)
+    out[:, torch.arange(edge_index.size(1), device=edge_index.device) + edge_index[1]] = edge_index
+    out[:, ptr[1:] + nodes[:-1]] = nodes[:-1]
+
+    return out, ptr + nodes
 
 
 class ModelPretreatment:
@@ -8,18 +44,165 @@ class ModelPretreatment:
         
         self.add_self_loops = add_self_loops
         self.normalize = normalize
+        self.cache = dict()
+
+    def normalization(self, edge_index: Adj, deg):
+
+        # symmetric normalization, ie. the weight of edge (j, i) is 1/sqrt(deg(j)*deg(i))
+        row, col = edge_index
+        deg_inv_sqrt = deg.pow(-0.5)
+        deg_inv_sqrt[deg_inv_sqrt == float('inf')] = 0
+
+        return deg_inv_sqrt[row] * deg_inv_sqrt[col]
 
     def pretreatment(self, num_nodes: int, edge_index: Adj, dtype):
 
+        if is_sorted_by_col(edge_index):
+            return self.sorted_pretreatment(num_nodes, edge_index, dtype)
+
         if self.add_self_loops:
             edge_index = add_remaining_self_loops(edge_index, num_nodes=num_nodes)[0]
 
         edge_weight = None
         if self.normalize:
-            row, col = edge_index
-            deg = degree(col, num_nodes, dtype=dtype)   # in-degree of the nodes
-            deg_inv_sqrt = deg.pow(-0.5)
-            deg_inv_sqrt[deg_inv_sqrt == float('inf')] = 0
-            edge_weight = deg_inv_sqrt[row] * deg_inv_sqrt[col]
+            deg = degree(edge_index[1], num_nodes, dtype=dtype) # in-degree of the nodes
+            edge_weight = self.normalization(edge_index, deg)
         
-        return edge_index, edge_weight
\ No newline at end of file
+        return edge_index, edge_weight
+
+    def sorted_pretreatment(self, num_nodes: int, edge_index: Adj, dtype):
+
+        '''
+        Same as `pretreatment`, for edges sorted by destination, which are kept sorted, with the in-degrees read
+        off the pointer of the destinations, instead of scattered. The edges are returned as an EdgeIndex in CSC
+        layout, from which message passing takes the pointer to aggregate the in-edges of each node as a segment.
+        '''
+
+        if self.add_self_loops:
+            edge_index, ptr = add_sorted_self_loops(edge_index, num_nodes)
+        elif self.normalize:
+            ptr = index2ptr(edge_index[1], num_nodes)
+
+        edge_weight = None
+        if self.normalize:
+            deg = (ptr[1:] - ptr[:-1]).to(dtype)        # in-degree of the nodes
+            edge_weight = self.normalization(edge_index, deg)
+
+        edge_index = EdgeIndex(edge_index, sparse_size=(num_nodes, num_nodes), sort_order='col')
+
+        return edge_index, edge_weight
+
+    def masked_pretreatment(self, num_nodes: int, edge_index: Adj, edge_mask, dtype):
+
+        '''
+        Same as `pretreatment` of the edges kept by `edge_mask` (all of them if None), fused into one pass: the
+        in-degrees are scattered from the mask, instead of from the kept edges, and the kept edges and the self
+        loops are written into a preallocated edge list, in the order in which `pretreatment` has them, instead
+        of compacting the edges, and then concatenating them with the self loops. The edges must not have self
+        loops if they are to be added, eg. after GCNLayer.strip_adj_mat.
+
+        The mask is either boolean (|E|,), or the positions of the kept edges in increasing order (see
+        BaseDropout.edge_mask), from which the in-degrees are counted over the kept edges only.
+        '''
+
+        if edge_mask is None:
+            return self.pretreatment(num_nodes, edge_index, dtype)
+
+        device = edge_index.device
+        if edge_mask.dtype == torch.bool:
+            kept = edge_mask.nonzero().flatten()
+            # in-degree of the nodes, without the self loops
+            counts = torch.zeros(num_nodes, dtype=torch.long, device=device).index_add_(0, edge_index[1], edge_mask.long())
+        else:
+            kept = edge_mask
+        row, col = edge_index[0].index_select(0, kept), edge_index[1].index_select(0, kept)
+        if edge_mask.dtype != torch.bool:
+            # counted over the kept edges only, in time proportional to their number
+            counts = torch.bincount(col, minlength=num_nodes)
+        sort = is_sorted_by_col((row, col))
+        num_kept, num_loops = kept.size(0), num_nodes if self.add_self_loops else 0
+
+        out = edge_index.new_empty(2, num_kept+num_loops)
+        if sort and self.add_self_loops:
+            # like add_sorted_self_loops, the self loop of each node is placed after its other in-edges
+            nodes = torch.arange(num_nodes, device=device)
+            positions, loop_positions = torch.arange(num_kept, device=device) + col, counts.cumsum(dim=0) + nodes
+            out[0].index_copy_(0, positions, row).index_copy_(0, loop_positions, nodes)
+            out[1].index_copy_(0, positions, col).index_copy_(0, loop_positions, nodes)
+        else:
+            out[0, :num_kept], out[1, :num_kept] = row, col
+            if self.add_self_loops:
+                out[:, num_kept:] = torch.arange(num_nodes, device=device)
+
+        edge_weight = None
+        if self.normalize:
+            deg = (counts + int(self.add_self_loops)).to(dtype)
+            edge_weight = self.normalization(out, deg)
+
+        if sort:
+            out = EdgeIndex(out, sparse_size=(num_nodes, num_nodes), sort_order='col')
+
+        return out, edge_weight
+
+    def sparse_layout(self, edge_index: Adj, num_nodes: int):
+
+        '''
+        CSR layout of the transposed adjacency matrix, ie. with the in-edges of each node in its row, of the edges
+        and the self loops added by `pretreatment`, which must not be in `edge_index` already. The in-edges of each
+        node are in the order in which propagate aggregates them, ie. the edges in order, and the self loop last.
+
+        Returns:
+            row, col (Tensor): sources and destinations of the edges, followed by the self loops (|E|+|V|,).
+            perm (Tensor): position in row and col of each nonzero of the CSR matrix (|E|+|V|,).
+            crow_indices, col_indices (Tensor): CSR layout of the transposed adjacency matrix.
+        '''
+
+        row, col = edge_index
+        if self.add_self_loops:
+            loops = torch.arange(num_nodes, device=edge_index.device)
+            row, col = torch.cat((row, loops)), torch.cat((col, loops))
+
+        sorted_col, perm = torch.sort(col, stable=True)
+
+        return row, col, perm, index2ptr(sorted_col, num_nodes), row[perm]
+
+    def sparse_pretreatment(self, num_nodes: int, layout, edge_mask, dtype):
+
+        '''
+        Same as `pretreatment` of the edges kept by `edge_mask` (all of them if None), as a sparse CSR matrix with
+        the given layout, in which the dropped edges are zeroed instead of removed.
+        '''
+
+        row, col, perm, crow_indices, col_indices = layout
+        edge_weight = torch.ones(row.size(0), dtype=dtype, device=row.device)
+        if edge_mask is not None and edge_mask.dtype == torch.bool:
+            edge_weight[:edge_mask.size(0)] = edge_mask
+        elif edge_mask is not None:
+            # positions of the kept edges, which are all before the self loops
+            edge_weight[:row.size(0)-(num_nodes if self.add_self_loops else 0)] = 0
+            edge_weight[edge_mask] = 1
+
+        if self.normalize:
+            deg = torch.zeros(num_nodes, dtype=dtype, device=row.device).index_add_(0, col, edge_weight)  # in-degree of the nodes
+            edge_weight = edge_weight * self.normalization((row, col), deg)
+
+        return torch.sparse_csr_tensor(crow_indices, col_indices, edge_weight[perm], size=(num_nodes, num_nodes))
+
+    def cached(self, treat_adj_mat, edge_index: Adj, num_nodes: int, dtype):
+
+        '''
+        Treat the adjacency matrix with `treat_adj_mat(edge_index, num_nodes, dtype)`, reusing the result of
+        the previous call to the same function (by name) if it was on the same input graph, ie. the same tensor,
+        not modified in place since. Only valid if the treatment is deterministic.
+        '''
+
+        key = (edge_index._version, edge_index.device, num_nodes, dtype)
+        cached = self.cache.get(treat_adj_mat.__name__)
+        if cached is not None and cached[0]() is edge_index and cached[1] == key:
+            return cached[2]
+
+        out = treat_adj_mat(edge_index, num_nodes, dtype)
+        # a weak reference, so that the cache does not keep the input graph (eg. a mini-batch) alive
+        self.cache[treat_adj_mat.__name__] = (weakref.ref(edge_index), key, out)
+
+        return out
\ No newline at end of file
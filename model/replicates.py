@@ -0,0 +1,100 @@
+from typing import List, Union, Optional
+
+import torch
+from torch import Tensor, BoolTensor
+from torch.nn import Module, ModuleList
+from torch.func import functional_call, vmap
+from torch.optim import Optimizer
+from torch_geometric.typing import Adj
+
+from model.dropout import BaseDropout, Dropout, DropNode, DropMessage
+
+
+# Strategies whose random masks have a fixed shape, and which keep no state across forward passes.
+# Dropping from the adjacency matrix changes the number of edges, which cannot be batched by vmap.
+VECTORIZABLE = (BaseDropout, Dropout, DropNode, DropMessage)
+
+
+class Replicates(Module):
+
+    def __init__(self, models: List[Module]):
+
+        '''
+        Independently initialized replicates of the same model, trained together.
+
+        Args:
+            models: the replicates, all with the same architecture and dropping method.
+        '''
+
+        super(Replicates, self).__init__()
+
+        self.replicates = ModuleList(models)
+        drop_strategy = models[0].message_passing[0].drop_strategy
+        # messages computed in chunks are recomputed in backward by checkpointing, which vmap does not support
+        chunked = getattr(models[0].message_passing[0], 'chunk_size', None) is not None
+        self.vectorize = type(drop_strategy) in VECTORIZABLE and not chunked
+
+    def __len__(self):
+
+        return len(self.replicates)
+
+    def reset_parameters(self):
+
+        for model in self.replicates:
+            model.reset_parameters()
+
+    def stack_state(self):
+
+        param_names = [name for name, _ in self.replicates[0].named_parameters()]
+        params = zip(*(model.parameters() for model in self.replicates))
+        buffer_names = [name for name, _ in self.replicates[0].named_buffers()]
+        buffers = zip(*(model.buffers() for model in self.replicates))
+
+        params = {name: torch.stack(tensors) for name, tensors in zip(param_names, params)}
+        buffers = {name: torch.stack(tensors) for name, tensors in zip(buffer_names, buffers)}
+
+        return params, buffers
+
+    def forward(
+        self,
+        x: Tensor,
+        edge_index: Adj,
+        mask: Optional[Union[Tensor, BoolTensor]] = None,
+    ):
+
+        '''
+        Returns the stacked outputs of the replicates, of shape (R, ...), where $R is the number of replicates.
+        '''
+
+        if not self.vectorize:
+            return torch.stack([model(x, edge_index, mask) for model in self.replicates])
+
+        # Stacking keeps the parameters of each replicate as separate leaves,
+        # so that each replicate can still be optimized (and scheduled) on its own
+        params, buffers = self.stack_state()
+        call = lambda params, buffers: functional_call(self.replicates[0], (params, buffers), (x, edge_index, mask))
+        out = vmap(call, randomness='different')(params, buffers)
+
+        return out
+
+
+class ReplicateOptimizer:
+
+    def __init__(self, optimizers: List[Optimizer]):
+
+        '''
+        Step the optimizers of all replicates together. Each replicate keeps its own optimizer,
+        so that learning rate schedules (eg. ReduceLROnPlateau) can be applied per replicate.
+        '''
+
+        self.optimizers = optimizers
+
+    def zero_grad(self):
+
+        for optimizer in self.optimizers:
+            optimizer.zero_grad()
+
+    def step(self):
+
+        for optimizer in self.optimizers:
+            optimizer.step()
\ No newline at end of file
@@ -6,7 +6,7 @@ from collections import defaultdict
 import numpy as np
 import matplotlib.pyplot as plt
 
-from utils.parse_logs import parse_metrics, parse_configs
+from utils.warehouse import load_warehouse
 
 
 parser = argparse.ArgumentParser()
@@ -23,6 +23,10 @@ ps = np.round(np.arange(0.0, 1, 0.1), decimals=1)
 
 ncol = np.ceil(len(depths)/1)
 
+warehouse = load_warehouse()
+# best training metric, of the complete runs in each directory
+samples_by_dir = warehouse.query(metric, 'train_max', complete=True, by='parent_dir')
+
 fig, axs = plt.subplots(1, len(hetero_data), figsize=(6.4*len(hetero_data), 4.8))
 if not hasattr(axs, '__len__'): axs = (axs,)
 
@@ -31,7 +35,7 @@ axs[0].set_ylabel(f'Train {metric}', fontsize=20)
 for dataset, cutoff, ax in zip(hetero_data, hetero_cutoffs, axs):
 
     results_dir = f'./results/{args.dropout}/{dataset}'
-    exp_dir = results_dir + '/{args.gnn}/L={depth}/P={p}'
+    exp_dir = results_dir + '/{gnn}/L={depth}/P={p}'
 
     ### RETRIEVE METRICS ###
 
@@ -40,16 +44,10 @@ for dataset, cutoff, ax in zip(hetero_data, hetero_cutoffs, axs):
     for depth in depths:
         for p in ps:
             exp_dir_format = exp_dir.format(gnn=args.gnn, depth=depth, p=p)
-            if not os.path.exists(exp_dir_format):
-                continue
-            for sample_dir in os.listdir(exp_dir_format):
-                config = parse_configs(f'{exp_dir_format}/{sample_dir}/logs')
+            for sample_dir, config, others in warehouse.runs(parent_dir=os.path.normpath(exp_dir_format)):
                 if not all([x == 64 for x in eval(config['gnn_layer_sizes'])]):
-                    print(f'{exp_dir_format}/{sample_dir}')
-                train, val, test = parse_metrics(f'{exp_dir_format}/{sample_dir}/logs')
-                if len(train[metric]) != 300:
-                    continue
-                value = np.max(train[metric])
+                    print(sample_dir)
+            for value in samples_by_dir.get(os.path.normpath(exp_dir_format), list()):
                 if value > cutoff:
                     train_metrics[(depth, p)].append(value)
                 
@@ -7,7 +7,7 @@ import numpy as np
 from scipy.stats import spearmanr
 import matplotlib.pyplot as plt
 
-from utils.parse_logs import parse_metrics
+from utils.warehouse import load_warehouse
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--dataset', type=str, required=True, choices=['Cora', 'CiteSeer', 'Proteins', 'Mutag', 'PTC'])
@@ -30,6 +30,12 @@ assets_dir = results_dir.replace('results', 'assets') + f'/corr/{args.dataset}'
 
 ### RETRIEVE METRICS ###
 
+if args.which == 'Best':
+    statistics = ('train_max', 'train_max', 'test_at_val_max')
+elif args.which == 'Final':
+    statistics = ('train_max', 'train_final', 'test_final')
+samples_by_dir = load_warehouse().query(args.metric, statistics, by='parent_dir')
+
 train_metrics = defaultdict(list)
 test_metrics = defaultdict(list)
 gap_metrics = defaultdict(list)
@@ -38,17 +44,12 @@ for gnn in args.gnns:
     for depth in tqdm(depths):
         for p in ps:
             exp_dir_format = exp_dir.format(gnn=gnn, depth=depth, p=p)
-            for sample_dir in os.listdir(exp_dir_format):
-                train, val, test = parse_metrics(f'{exp_dir_format}/{sample_dir}/logs')
-                if max(train[args.metric]) < 0.5:
+            for train_max, train_metric, test_metric in samples_by_dir.get(os.path.normpath(exp_dir_format), list()):
+                if train_max < 0.5:
                     continue
-                if args.which == 'Best':
-                    train_metrics[(gnn, depth, p)].append(max(train[args.metric]))
-                    test_metrics[(gnn, depth, p)].append(test[args.metric][np.argmax(val[args.metric])])
-                elif args.which == 'Final':
-                    train_metrics[(gnn, depth, p)].append(train[args.metric][-1])
-                    test_metrics[(gnn, depth, p)].append(test[args.metric][-1])
-                gap_metrics[(gnn, depth, p)].append(train_metrics[(gnn, depth, p)][-1]-test_metrics[(gnn, depth, p)][-1])
+                train_metrics[(gnn, depth, p)].append(train_metric)
+                test_metrics[(gnn, depth, p)].append(test_metric)
+                gap_metrics[(gnn, depth, p)].append(train_metric-test_metric)
 
 ### PLOT FOR TRAIN SET ###
 
@@ -6,7 +6,7 @@ from collections import defaultdict
 import numpy as np
 import matplotlib.pyplot as plt
 
-from utils.parse_logs import parse_metrics, parse_configs
+from utils.warehouse import load_warehouse
 
 
 parser = argparse.ArgumentParser()
@@ -25,6 +25,10 @@ ps = np.round(np.arange(0.0, 1, 0.1), decimals=1)
 
 ncol = np.ceil(len(depths)/1)
 
+warehouse = load_warehouse()
+# test metric at the best validation epoch, of the complete runs in each directory
+samples_by_dir = warehouse.best_val_test(metric, complete=True, by='parent_dir')
+
 for fn, datasets, cutoffs in zip(('homophilic', 'heterophilic'), (homo_data, hetero_data), (homo_cutoffs, hetero_cutoffs)):
 
     fig, axs = plt.subplots(1, len(datasets), figsize=(6.4*len(datasets), 4.8))
@@ -35,7 +39,7 @@ for fn, datasets, cutoffs in zip(('homophilic', 'heterophilic'), (homo_data, het
     for dataset, cutoff, ax in zip(datasets, cutoffs, axs):
 
         results_dir = f'./results/{args.dropout}/{dataset}'
-        exp_dir = results_dir + '/{args.gnn}/L={depth}/P={p}'
+        exp_dir = results_dir + '/{gnn}/L={depth}/P={p}'
 
         ### RETRIEVE METRICS ###
 
@@ -44,16 +48,10 @@ for fn, datasets, cutoffs in zip(('homophilic', 'heterophilic'), (homo_data, het
         for depth in depths:
             for p in ps:
                 exp_dir_format = exp_dir.format(gnn=args.gnn, depth=depth, p=p)
-                if not os.path.exists(exp_dir_format):
-                    continue
-                for sample_dir in os.listdir(exp_dir_format):
-                    config = parse_configs(f'{exp_dir_format}/{sample_dir}/logs')
+                for sample_dir, config, others in warehouse.runs(parent_dir=os.path.normpath(exp_dir_format)):
                     if not all([x == 64 for x in eval(config['gnn_layer_sizes'])]):
-                        print(f'{exp_dir_format}/{sample_dir}')
-                    train, val, test = parse_metrics(f'{exp_dir_format}/{sample_dir}/logs')
-                    if len(train[metric]) != 300:
-                        continue
-                    value = np.max(test[metric][np.argmax(val[metric])])
+                        print(sample_dir)
+                for value in samples_by_dir.get(os.path.normpath(exp_dir_format), list()):
                     if value > cutoff:
                         test_metrics[(depth, p)].append(value)
                     
@@ -6,7 +6,7 @@ from tqdm import tqdm
 import numpy as np
 import matplotlib.pyplot as plt
 
-from utils.parse_logs import parse_metrics
+from utils.warehouse import load_warehouse
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--dataset', type=str, required=True)
@@ -19,11 +19,11 @@ args = parser.parse_args()
 
 if args.which == 'Best':
     if args.metric in ('Accuracy', 'F1 Score'):
-        get_best = np.argmax
+        statistics = ('train_max', 'test_at_val_max')
     else:
-        get_best = np.argmin
-else:
-    get_best = None
+        statistics = ('train_min', 'test_at_val_min')
+elif args.which == 'Final':
+    statistics = ('train_final', 'test_final')
 
 depths = range(args.min_depth, args.max_depth+1)
 ncol = np.ceil(len(depths)/1)
@@ -35,6 +35,8 @@ assets_dir = results_dir.replace('results', 'assets')
 
 ### RETRIEVE METRICS ###
 
+samples_by_dir = load_warehouse().query(args.metric, statistics, complete=True, by='parent_dir')
+
 train_metrics = defaultdict(list)
 test_metrics = defaultdict(list)
 gap_metrics = defaultdict(list)
@@ -43,17 +45,10 @@ for gnn in args.gnns:
     for depth in tqdm(depths):
         for p in ps:
             exp_dir_format = exp_dir.format(gnn=gnn, depth=depth, p=p)
-            for sample_dir in os.listdir(exp_dir_format):
-                train, val, test = parse_metrics(f'{exp_dir_format}/{sample_dir}/logs')
-                if len(train[args.metric]) != 500:
-                    continue
-                if args.which == 'Best':
-                    train_metrics[(gnn, depth, p)].append(train[args.metric][get_best(train[args.metric])])
-                    test_metrics[(gnn, depth, p)].append(test[args.metric][get_best(val[args.metric])])
-                elif args.which == 'Final':
-                    train_metrics[(gnn, depth, p)].append(train[args.metric][-1])
-                    test_metrics[(gnn, depth, p)].append(test[args.metric][-1])
-                gap_metrics[(gnn, depth, p)].append(train_metrics[(gnn, depth, p)][-1]-test_metrics[(gnn, depth, p)][-1])
+            for train_metric, test_metric in samples_by_dir.get(os.path.normpath(exp_dir_format), list()):
+                train_metrics[(gnn, depth, p)].append(train_metric)
+                test_metrics[(gnn, depth, p)].append(test_metric)
+                gap_metrics[(gnn, depth, p)].append(train_metric-test_metric)
 
 train_metrics = {exp: (np.mean(samples[:5]), np.std(samples[:5])) for exp, samples in train_metrics.items()}
 test_metrics = {exp: (np.mean(samples[:5]), np.std(samples[:5])) for exp, samples in test_metrics.items()}
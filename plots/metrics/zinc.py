@@ -4,7 +4,7 @@ import argparse
 import numpy as np
 import matplotlib.pyplot as plt
 
-from utils.parse_logs import parse_metrics, parse_configs
+from utils.warehouse import load_warehouse
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--sd', action='store_true')
@@ -41,20 +41,15 @@ drop_ps = (
     0.5
 )
 metric = 'Mean Absolute Error'
+# test metric at the best validation epoch, of the complete runs in each directory
+samples_by_dir = load_warehouse().best_val_test(metric, maximize=False, complete=True, by='parent_dir')
 
 def plot(ax, gnn, dropout, drop_p):
     
     means, stds = list(), list()
     for distance in distances:
         exp_dir_format = exp_dir.format(dropout=dropout, gnn=gnn, distance=distance, drop_p=drop_p)
-        samples = list()
-        for timestamp in os.listdir(exp_dir_format):
-            train, val, test = parse_metrics(f'{exp_dir_format}/{timestamp}/logs')
-            if len(test.get(metric, [])) < 500:
-                continue
-            sample = test[metric][np.argmin(val[metric])]
-            # sample = np.min(train[metric])
-            samples.append(sample)
+        samples = samples_by_dir.get(os.path.normpath(exp_dir_format), list())
         means.append(np.mean(samples))
         stds.append(np.std(samples))
     means, stds = np.array(means), np.array(stds)
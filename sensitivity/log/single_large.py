@@ -5,18 +5,20 @@ from tqdm import tqdm
 import numpy as np
 from scipy.sparse.csgraph import connected_components, shortest_path
 import torch
-from torch_geometric.utils import subgraph, to_scipy_sparse_matrix, degree, remove_self_loops, add_remaining_self_loops
+from torch_geometric.utils import subgraph, to_scipy_sparse_matrix, remove_self_loops
 
 from utils.config import parse_arguments
 from dataset import get_dataset
 from model import Model as BaseModel
 from model.message_passing.pretreatment import ModelPretreatment as BaseModelPretreatment
-from sensitivity.utils import get_jacobian_norms
+from sensitivity.utils import get_jacobian_norms, sketch_commute_times
 
 
 NODE_SAMPLES = 25
 MASK_SAMPLES = 5
 INIT_SAMPLES = 5
+# Relative error of the commute times, which are approximated since the graph is large
+CT_EPS = 0.3
 
 config, others = parse_arguments(return_others=True)
 jac_norms_dir = f'./jac-norms/{config.dataset}'
@@ -34,21 +36,15 @@ if config.drop_p == 0.0:
 
 class ModelPretreatment(BaseModelPretreatment):
 
-    def pretreatment(self, num_nodes, edge_index, dtype):
-        if self.add_self_loops:
-            edge_index = add_remaining_self_loops(edge_index, num_nodes=num_nodes)[0]
-        edge_weight = None
-        if self.normalize:
-            col = edge_index[1]
-            deg = degree(col, num_nodes, dtype=dtype)
-            # Performing asymmetric normalization because subgraph sampling changes the in-degree 
-            #   of source nodes at distance L, making symmetric normalization inaccurate
-            # NOTE: the in-degrees of nodes at distance <L remains the same, since all their
-            #   neighbors will be at distance <=L from the target, including them in the subgraph
-            # NOTE: this is an implementation hack, not a scientifically motivated decision
-            deg_inv = deg.pow(-1)
-            edge_weight = deg_inv[col]
-        return edge_index, edge_weight
+    def normalization(self, edge_index, deg):
+        col = edge_index[1]
+        # Performing asymmetric normalization because subgraph sampling changes the in-degree 
+        #   of source nodes at distance L, making symmetric normalization inaccurate
+        # NOTE: the in-degrees of nodes at distance <L remains the same, since all their
+        #   neighbors will be at distance <=L from the target, including them in the subgraph
+        # NOTE: this is an implementation hack, not a scientifically motivated decision
+        deg_inv = deg.pow(-1)
+        return deg_inv[col]
 
 
 class Model(BaseModel):
@@ -77,6 +73,9 @@ num_nodes = dataset.x.size(0)
 # Doesn't matter if self-loops are not removed here since A is only used for computing connected components and shortest distances
 A = to_scipy_sparse_matrix(dataset.edge_index)
 
+# Embeddings whose squared distances are the commute times within each component, computed once for all target nodes
+commute_times_sketch = sketch_commute_times(dataset.edge_index, num_nodes, eps=CT_EPS, generator=torch.Generator().manual_seed(0))
+
 # Sample nodes from the largest component
 assignments = connected_components(A, return_labels=True)[1]
 cc_labels, sizes = np.unique(assignments, return_counts=True)
@@ -108,6 +107,12 @@ for i in tqdm(node_samples):
         # Save the distance from the source nodes lying within the receptive field of node i
         torch.save(shortest_distances[subset], fn)
 
+    fn = f'{i_dir}/commute_times.pkl'
+    if not os.path.isfile(fn):
+        os.makedirs(i_dir, exist_ok=True)
+        # Save the commute times between node i and the source nodes lying within its receptive field
+        torch.save((commute_times_sketch[subset] - commute_times_sketch[i]).pow(2).sum(dim=1), fn)
+
     edge_index, _ = subgraph(subset, dataset.edge_index, relabel_nodes=True, num_nodes=dataset.x.size(0))
     # Checked the implementation -- relabelling is such that subset[i] is relabelled as i
     x = dataset.x[subset, :]
@@ -0,0 +1,94 @@
+import warnings; warnings.filterwarnings('ignore')
+import os
+import argparse
+from tqdm import tqdm
+
+import numpy as np
+import torch
+import matplotlib.pyplot as plt
+
+from sensitivity.utils import aggregate
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--L', type=int, default=6)
+parser.add_argument('--drop_p', type=float, default=0.5)
+parser.add_argument('--n_bins', type=int, default=10)
+args = parser.parse_args()
+
+dataset = 'Cora'
+models = (
+    ('NoDrop', 'GCN', args.drop_p),
+    ('DropEdge', 'GCN', args.drop_p),
+    ('DropSens', 'GCN', 0.8),
+    ('DropNode', 'GCN', args.drop_p),
+    ('DropAgg', 'GCN', args.drop_p),
+    ('DropGNN', 'GCN', args.drop_p),
+)
+# Mean aggregation, like in jac_norm_vs_sd.py
+agg = 'mean'
+
+jac_norms_dir = './jac-norms'
+dataset_dir = f'{jac_norms_dir}/{dataset}'
+fig, ax = plt.subplots(1, 1, figsize=(6.4, 4.8)); ncol = 2
+MODEL_SAMPLES = 25
+
+# Commute times (approximated by sensitivity/log/single_large.py) between each target and its receptive field
+commute_times = dict()
+for i_dir in os.listdir(dataset_dir):
+    i_dir = f'{dataset_dir}/{i_dir}/L={args.L}'
+    if os.path.isfile(f'{i_dir}/commute_times.pkl'):
+        commute_times[i_dir] = torch.load(f'{i_dir}/commute_times.pkl')
+
+# Commute times are continuous, so the pairs are binned by the quantiles over all targets,
+#   excluding the target itself, which is at commute time 0
+all_commute_times = torch.cat(list(commute_times.values()))
+all_commute_times = all_commute_times[all_commute_times > 0]
+bin_edges = torch.quantile(all_commute_times, torch.linspace(0, 1, args.n_bins+1)[1:-1])
+bin_assignments = {i_dir: torch.bucketize(ct, bin_edges) for i_dir, ct in commute_times.items()}
+# Mean commute time of each bin, where its sensitivity is plotted
+x = aggregate(all_commute_times, torch.bucketize(all_commute_times, bin_edges), torch.arange(args.n_bins), agg='mean')
+
+for dropout, gnn, drop_p in tqdm(models):
+
+    P = 0.0 if dropout == 'NoDrop' else drop_p
+
+    count_pairs = torch.zeros(args.n_bins)
+    sum_norms = torch.zeros(MODEL_SAMPLES, args.n_bins)
+
+    for i_dir, assignments in bin_assignments.items():
+
+        model_dir = f'{i_dir}/{gnn}/{dropout}/P={P}'
+        if not os.path.isdir(model_dir) or not os.listdir(model_dir):
+            continue
+
+        # Skip the target itself
+        source_mask = commute_times[i_dir] > 0
+        assignments = assignments[source_mask]
+        x_ct, count = torch.unique(assignments, return_counts=True)
+        count_pairs[x_ct] += (count if agg == 'sum' else 1)
+
+        for sample in range(1, MODEL_SAMPLES+1):
+            jac_norms = torch.load(f'{model_dir}/sample={sample}.pkl')[source_mask]
+            y_ct = aggregate(jac_norms, assignments, x_ct, agg=agg)
+            sum_norms[sample-1, x_ct] += y_ct
+
+    # Average over the target nodes
+    mean_norms = sum_norms/count_pairs
+
+    # Average over initialization and/or mask samples
+    std, mean = torch.std_mean(mean_norms, dim=0)
+    ax.plot(x, mean, label=dropout)
+
+ax.set_xlabel('Commute Times', fontsize=18)
+ax.set_ylabel('Mean Sensitivity', fontsize=18)
+ax.set_xscale('log')
+ax.set_yscale('log')
+ax.grid()
+
+handles, labels = ax.get_legend_handles_labels()
+fig.legend(handles, labels, loc='lower left', fontsize=15, ncol=ncol, bbox_to_anchor = (0.132, 0.135))
+fig.tight_layout()
+
+fn = f'./assets/sensitivity_ct.png'
+os.makedirs(os.path.dirname(fn), exist_ok=True)
+plt.savefig(fn, bbox_inches='tight')
\ No newline at end of file
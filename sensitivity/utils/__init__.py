@@ -1,3 +1,5 @@
+import math
+
 from scipy.sparse.csgraph import connected_components, shortest_path
 import torch
 from torch.func import jacrev
@@ -5,6 +7,8 @@ from torch_geometric.utils.num_nodes import maybe_num_nodes
 from torch_geometric.utils import degree, is_undirected, to_undirected, \
     remove_self_loops, to_scipy_sparse_matrix
 
+from dataset.utils import segment_index
+
 
 def is_connected(edge_index):
     
@@ -48,6 +52,209 @@ def compute_commute_times(edge_index, P=0.):
 
     return C
 
+def compute_commute_times_batched(edge_indices, P=0., max_batch_elements=2**24):
+
+    '''
+    Commute times of many small graphs, identical to calling `compute_commute_times` on each of them.
+    Graphs with the same number of nodes are stacked together, so that the pseudo-inverses of their Laplacians
+    are computed in one batched call, in chunks of at most `max_batch_elements` matrix entries.
+
+    Args:
+        edge_indices (List[Tensor]): edge index of each graph.
+    Returns:
+        commute_times (Tensor): flattened (row-major) commute time matrices, concatenated over the graphs.
+        ptr (Tensor): the matrix of graph i is commute_times[ptr[i]:ptr[i+1]].view(sizes[i], sizes[i]).
+        sizes (Tensor): number of nodes of each graph (as inferred from its edge index).
+    '''
+
+    # All graphs at once, as their disjoint union, where edges are labelled by their graph
+    graph_sizes = torch.tensor([edge_index.size(1) for edge_index in edge_indices], dtype=torch.long)
+    edge_graphs = torch.repeat_interleave(torch.arange(graph_sizes.size(0)), graph_sizes)
+    edge_index = torch.cat(edge_indices, dim=1).long()
+    # Can alternatively add remaining self loops, since D-A remains unchanged
+    edge_index, edge_graphs = edge_index[:, edge_index[0] != edge_index[1]], edge_graphs[edge_index[0] != edge_index[1]]
+    # Number of nodes as inferred by `maybe_num_nodes`, ie. the largest node index + 1
+    sizes = torch.zeros_like(graph_sizes).scatter_reduce_(0, edge_graphs, edge_index.max(dim=0).values+1, reduce='amax')
+    ptr = torch.cat((sizes.new_zeros(1), (sizes**2).cumsum(dim=0)))
+
+    # Each graph is connected iff the union has as many connected components as graphs
+    node_offsets = sizes.cumsum(dim=0) - sizes
+    num_nodes = int(sizes.sum())
+    union_edge_index = edge_index + node_offsets[edge_graphs]
+    assert is_undirected(union_edge_index, num_nodes=num_nodes)
+    assert connected_components(to_scipy_sparse_matrix(union_edge_index, num_nodes=num_nodes), directed=False, return_labels=False) == sizes.size(0)
+
+    # Position of each graph in the stack of graphs of its size
+    positions = torch.empty_like(sizes)
+    commute_times = torch.empty(int(ptr[-1]))
+    for size in sizes.unique().tolist():
+        ids = (sizes == size).nonzero().flatten()
+        positions[ids] = torch.arange(ids.size(0))
+        for chunk in ids.split(max(1, max_batch_elements // max(1, size**2))):
+            in_chunk = (sizes[edge_graphs] == size) & (positions[edge_graphs] >= positions[chunk[0]]) & (positions[edge_graphs] <= positions[chunk[-1]])
+            batch, (row, col) = positions[edge_graphs[in_chunk]] - positions[chunk[0]], edge_index[:, in_chunk]
+            # D - A, with degrees counting repeated edges, like `degree`, and A binary, like `to_adj_mat`
+            degrees = torch.zeros(chunk.size(0), size).index_put_((batch, col), torch.ones(col.size(0)), accumulate=True)
+            L = torch.diag_embed(degrees)
+            L[batch, row, col] = -1.
+            # torch.linalg.pinv(L), with the SVDs batched, but the products not, since a batched matmul
+            # sums in a different order than torch.linalg.pinv does for a single matrix
+            U, S, Vh = torch.linalg.svd(L, full_matrices=False)
+            tol = torch.finfo(L.dtype).eps * size * S[:, :1]
+            S_pinv = torch.where(S > tol, S.reciprocal(), 0.)
+            L_pinv = torch.stack([torch.matmul(V, U_H) for V, U_H in zip(Vh.mH * S_pinv.unsqueeze(1), U.mH)])
+            L_pinv_diag = torch.diagonal(L_pinv, dim1=1, dim2=2)
+            beta = torch.sum(degrees / (1-P**degrees), dim=1)
+            C = beta.view(-1, 1, 1) * (L_pinv_diag.unsqueeze(1) + L_pinv_diag.unsqueeze(2) - 2*L_pinv)
+            commute_times[segment_index(ptr[chunk], sizes[chunk]**2)] = C.flatten()
+
+    return commute_times, ptr, sizes
+
+def laplacian(edge_index, num_nodes=None, dtype=torch.float64):
+
+    # Sparse Laplacian D-A of the simple graph underlying `edge_index`, and its diagonal
+    num_nodes = maybe_num_nodes(edge_index, num_nodes)
+    edge_index = to_undirected(remove_self_loops(edge_index)[0], num_nodes=num_nodes)
+    degrees = degree(edge_index[1], num_nodes, dtype=dtype)
+    loops = torch.arange(num_nodes, device=edge_index.device).repeat(2, 1)
+    L = torch.sparse_coo_tensor(
+        torch.cat((edge_index, loops), dim=1),
+        torch.cat((-torch.ones(edge_index.size(1), dtype=dtype, device=edge_index.device), degrees)),
+        size=(num_nodes, num_nodes),
+    ).coalesce().to_sparse_csr()
+
+    return L, degrees
+
+def solve_laplacian(L, degrees, b, tol=1e-6, max_iter=None):
+
+    '''
+    Solve L x = b for every column of b with the conjugate gradient method, preconditioned by the degrees.
+    L is singular, but the system is consistent when every column of b sums to 0 over each connected component,
+    and the solution is then unique up to a constant per component, which cancels out in x_u - x_v.
+
+    Args:
+        L (Tensor): sparse Laplacian, as returned by `laplacian`.
+        degrees (Tensor): diagonal of L, ie. the degrees of the nodes.
+        b (Tensor): right hand sides, of shape (num_nodes, k).
+        tol (float): relative residual ||b - L x|| / ||b|| to stop at, for every column.
+        max_iter (int): maximum number of iterations, defaults to the number of nodes.
+    '''
+
+    max_iter = max_iter if isinstance(max_iter, int) else L.size(0)
+    degrees_inv = torch.where(degrees > 0, 1. / degrees, 0.).unsqueeze(1)
+    b_norm = b.norm(dim=0).clamp(min=torch.finfo(b.dtype).tiny)
+
+    x = torch.zeros_like(b)
+    r = b.clone()
+    z = degrees_inv * r
+    p = z.clone()
+    rz = (r*z).sum(dim=0)
+    for _ in range(max_iter):
+        Lp = L @ p
+        pLp = (p*Lp).sum(dim=0)
+        # converged columns have p = 0, and are left as they are
+        alpha = torch.where(pLp > 0, rz / pLp.clamp(min=torch.finfo(b.dtype).tiny), 0.)
+        x += alpha * p
+        r -= alpha * Lp
+        if (r.norm(dim=0) / b_norm).max() < tol:
+            break
+        z = degrees_inv * r
+        rz_new = (r*z).sum(dim=0)
+        p = z + torch.where(rz > 0, rz_new / rz.clamp(min=torch.finfo(b.dtype).tiny), 0.) * p
+        rz = rz_new
+
+    return x
+
+def component_volumes(edge_index, degrees, P=0.):
+
+    '''
+    Volume of the connected component of each node, ie. the sum of the degrees d over it (each replaced by
+    d / (1-P^d), like in `compute_commute_times`), which scales the effective resistances within the component
+    into commute times. Isolated nodes add nothing to the volume, and have a volume of 0 themselves.
+    '''
+
+    num_nodes = degrees.size(0)
+    labels = connected_components(to_scipy_sparse_matrix(edge_index.cpu(), num_nodes=num_nodes), directed=False, return_labels=True)[1]
+    labels = torch.from_numpy(labels).to(degrees.device)
+    weights = torch.where(degrees > 0, degrees / (1-P**degrees), 0.)
+
+    return torch.zeros_like(weights).index_add_(0, labels, weights)[labels]
+
+def num_projections(num_nodes, eps):
+
+    # Johnson-Lindenstrauss dimension preserving the n^2 pairwise distances within a factor of 1+-eps,
+    # with probability at least 1-1/n (Achlioptas, 2003)
+    return math.ceil(6 * math.log(max(num_nodes, 2)) / (eps**2/2 - eps**3/3))
+
+def sketch_commute_times(edge_index, num_nodes=None, eps=0.3, P=0., tol=1e-6, max_iter=None, generator=None):
+
+    '''
+    Node embeddings Z such that the commute time between nodes u and v is ||Z[u]-Z[v]||^2 within a factor of
+    1+-eps, with high probability, following Spielman and Srivastava (2008): the effective resistance between
+    u and v is ||W^{1/2} B L^+ (e_u-e_v)||^2, where B is the edge-node incidence matrix, and projecting the
+    rows of W^{1/2} B L^+ onto k = O(log n / eps^2) random directions preserves these distances. Each of the
+    k projections is one sparse Laplacian solve, so the time is O(k |E|) per CG iteration, and the memory
+    O(k |V|), instead of the O(|V|^3) time and O(|V|^2) memory of `compute_commute_times`.
+
+    Args:
+        eps (float): relative error of the projections.
+        P (float): drop probability, which scales the commute times like in `compute_commute_times`.
+        tol, max_iter: stopping criteria of the conjugate gradient solver, see `solve_laplacian`.
+        generator (torch.Generator): source of the random projections.
+    Returns:
+        Z (Tensor): embeddings of shape (num_nodes, k).
+    '''
+
+    L, degrees = laplacian(edge_index, num_nodes)
+    num_nodes = L.size(0)
+    # Each undirected edge once, with a random +-1/sqrt(k) weight in each projection
+    row, col = L.to_sparse_coo().indices()
+    row, col = row[row < col], col[row < col]
+    k = num_projections(num_nodes, eps)
+    Q = (2 * torch.randint(0, 2, (row.size(0), k), generator=generator, device=row.device) - 1).to(degrees.dtype) / math.sqrt(k)
+    # Rows of B^T Q, which sum to 0 over each connected component
+    Y = torch.zeros((num_nodes, k), dtype=degrees.dtype, device=degrees.device)
+    Y.index_add_(0, row, Q).index_add_(0, col, -Q)
+    Z = solve_laplacian(L, degrees, Y, tol=tol, max_iter=max_iter)
+
+    # Scaled by the volume of each component, so that the distances within it are the commute times
+    beta = component_volumes(edge_index, degrees, P)
+
+    return (beta.sqrt().unsqueeze(1) * Z).float()
+
+def approximate_commute_times(edge_index, num_nodes=None, node_pairs=None, source=None, eps=0.3, P=0., tol=1e-6, max_iter=None, generator=None):
+
+    '''
+    Approximate commute times for large graphs, where `compute_commute_times` is infeasible, between
+        - the `node_pairs`, of shape (2, num_pairs), solving one system per pair (so the error is only that of
+          the solver) if there are fewer pairs than projections, and using `sketch_commute_times` otherwise;
+        - the `source` node and every node, from the sketch;
+        - every pair of nodes, from the sketch, if neither is passed.
+    The commute times are those within the connected component of each pair, scaled by the volume of the component
+    rather than of the whole graph. Nodes in different components get a meaningless value, rather than infinity.
+
+    Args: see `sketch_commute_times`.
+    '''
+
+    num_nodes = maybe_num_nodes(edge_index, num_nodes)
+    if node_pairs is not None and node_pairs.size(1) < num_projections(num_nodes, eps):
+        L, degrees = laplacian(edge_index, num_nodes)
+        columns = torch.arange(node_pairs.size(1), device=node_pairs.device)
+        b = torch.zeros((num_nodes, node_pairs.size(1)), dtype=degrees.dtype, device=degrees.device)
+        b[node_pairs[0], columns] += 1.
+        b[node_pairs[1], columns] -= 1.
+        x = solve_laplacian(L, degrees, b, tol=tol, max_iter=max_iter)
+        beta = component_volumes(edge_index, degrees, P)[node_pairs[0]]
+        return (beta * (x[node_pairs[0], columns] - x[node_pairs[1], columns])).float()
+
+    Z = sketch_commute_times(edge_index, num_nodes, eps=eps, P=P, tol=tol, max_iter=max_iter, generator=generator)
+    if node_pairs is not None:
+        return (Z[node_pairs[0]] - Z[node_pairs[1]]).pow(2).sum(dim=1)
+    if source is not None:
+        return (Z - Z[source]).pow(2).sum(dim=1)
+
+    return torch.cdist(Z, Z).pow(2)
+
 def get_jacobian_norms(x, edge_index, model, config, mask=None, n_samples=1):
 
     if mask is None:
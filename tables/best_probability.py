@@ -5,7 +5,7 @@ import warnings; warnings.filterwarnings('ignore')
 
 import numpy as np
 
-from utils.parse_logs import parse_metrics
+from utils.warehouse import load_warehouse
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--node', action='store_true')
@@ -45,24 +45,14 @@ cutoffs = {
 metric = 'Accuracy'
 drop_ps = np.round(np.arange(0.1, 1, 0.1), decimals=1)
 exp_dir = './results/{dropout}/{dataset}/{gnn}/L=4/P={drop_p}'
+# test metric at the best validation epoch, of the complete runs in each directory
+samples_by_dir = load_warehouse().best_val_test(metric, complete=True, by='parent_dir')
 
 
 def get_samples(dataset, gnn, dropout, drop_p):
 
     exp_dir_format = exp_dir.format(dropout=dropout, dataset=dataset, gnn=gnn, drop_p=drop_p)
-    samples = list()
-    if not os.path.isdir(exp_dir_format):
-        return samples
-    for timestamp in os.listdir(exp_dir_format):
-        train, val, test = parse_metrics(f'{exp_dir_format}/{timestamp}/logs')
-        if len(test.get(metric, [])) < 300:
-            # print(f'Incomplete training run: {exp_dir_format}/{timestamp}')
-            continue
-        # if np.max(train[metric]) < cutoffs[dataset]:
-            # print(f'Failed to learn: {exp_dir_format}/{timestamp}, {np.max(train[metric])} < {cutoffs[dataset]}')
-            # pass
-        sample = test[metric][np.argmax(val[metric])]
-        samples.append(sample)
+    samples = samples_by_dir.get(os.path.normpath(exp_dir_format), list())
 
     if len(samples) < 20:
         print(dataset, gnn, dropout, drop_p)
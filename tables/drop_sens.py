@@ -6,7 +6,7 @@ import warnings; warnings.filterwarnings('ignore')
 import numpy as np
 from scipy import stats
 
-from utils.parse_logs import parse_metrics
+from utils.warehouse import load_warehouse
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--node', action='store_true')
@@ -46,6 +46,8 @@ metric = 'Accuracy'
 drop_ps = (0.2, 0.3, 0.5, 0.8)
 info_loss_ratios = (0.5, 0.8, 0.9, 0.95)
 exp_dir = './results/{dropout}/{dataset}/{gnn}/L=4/P={drop_p}/C={info_loss_ratio}'
+# test metric at the best validation epoch, of the complete runs in each directory
+samples_by_dir = load_warehouse().best_val_test(metric, complete=True, by='parent_dir')
 
 
 def get_samples(dataset, gnn, dropout, drop_p, info_loss_ratio):
@@ -54,20 +56,7 @@ def get_samples(dataset, gnn, dropout, drop_p, info_loss_ratio):
     if info_loss_ratio is None:
         exp_dir_format = os.path.dirname(exp_dir_format)
 
-    samples = list()
-    if not os.path.isdir(exp_dir_format):
-        return samples
-    
-    for timestamp in os.listdir(exp_dir_format):
-        train, val, test = parse_metrics(f'{exp_dir_format}/{timestamp}/logs')
-        if len(test.get(metric, [])) < 300:
-            # print(f'Incomplete training run: {exp_dir_format}/{timestamp}')
-            continue
-        # if np.max(train[metric]) < cutoffs[dataset]:
-            # print(f'Failed to learn: {exp_dir_format}/{timestamp}, {np.max(train[metric])} < {cutoffs[dataset]}')
-            # pass
-        sample = test[metric][np.argmax(val[metric])]
-        samples.append(sample)
+    samples = samples_by_dir.get(os.path.normpath(exp_dir_format), list())
 
     if len(samples) < 20:
         print(dataset, gnn, drop_p, info_loss_ratio)
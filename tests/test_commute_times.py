@@ -0,0 +1,48 @@
+import torch
+from torch_geometric.utils import subgraph, to_undirected
+
+from sensitivity.utils import compute_commute_times, approximate_commute_times
+
+
+def disconnected_graph():
+
+    # a path 0-1-2-3 and a cycle with a chord 5-6-7-8-9-5, 6-8, with the isolated node 4 between them
+    edge_index = torch.tensor([[0, 1, 2, 5, 6, 7, 8, 9, 6], [1, 2, 3, 6, 7, 8, 9, 5, 8]])
+    components = [torch.tensor([0, 1, 2, 3]), torch.tensor([5, 6, 7, 8, 9])]
+
+    return to_undirected(edge_index, num_nodes=10), 10, components
+
+def exact_commute_times(edge_index, num_nodes, components, P):
+
+    # the commute times of each component, as a graph on its own
+    C = torch.full((num_nodes, num_nodes), torch.nan)
+    for nodes in components:
+        component_edge_index, _ = subgraph(nodes, edge_index, relabel_nodes=True, num_nodes=num_nodes)
+        C[nodes.unsqueeze(1), nodes] = compute_commute_times(component_edge_index, P=P)
+
+    return C
+
+def test_pairs_within_components():
+
+    edge_index, num_nodes, components = disconnected_graph()
+    for P in (0., 0.5):
+        C = exact_commute_times(edge_index, num_nodes, components, P)
+        node_pairs = torch.cat([torch.cartesian_prod(nodes, nodes).T for nodes in components], dim=1)
+        # fewer pairs than projections, so one exact solve per pair
+        approximation = approximate_commute_times(edge_index, num_nodes, node_pairs=node_pairs, P=P, tol=1e-10)
+        assert not approximation.isnan().any()
+        assert torch.allclose(approximation, C[node_pairs[0], node_pairs[1]], rtol=1e-4, atol=1e-4)
+
+def test_sketch_within_components():
+
+    edge_index, num_nodes, components = disconnected_graph()
+    eps = 0.3
+    for P in (0., 0.5):
+        C = exact_commute_times(edge_index, num_nodes, components, P)
+        approximation = approximate_commute_times(edge_index, num_nodes, eps=eps, P=P, tol=1e-10, generator=torch.Generator().manual_seed(0))
+        assert not approximation.isnan().any()
+        for nodes in components:
+            exact, approximate = C[nodes.unsqueeze(1), nodes], approximation[nodes.unsqueeze(1), nodes]
+            assert ((approximate - exact).abs() <= eps * exact + 1e-4).all()
+        # the isolated node is at commute time 0 from itself
+        assert approximation[4, 4] == 0.
\ No newline at end of file
@@ -0,0 +1,44 @@
+import os
+import random
+
+import numpy as np
+import torch
+
+
+def get_rng_states():
+
+    states = {
+        'torch': torch.get_rng_state(),
+        'numpy': np.random.get_state(),
+        'python': random.getstate(),
+    }
+    if torch.cuda.is_available():
+        states['cuda'] = torch.cuda.get_rng_state_all()
+
+    return states
+
+def set_rng_states(states):
+
+    torch.set_rng_state(states['torch'])
+    np.random.set_state(states['numpy'])
+    random.setstate(states['python'])
+    if torch.cuda.is_available() and 'cuda' in states:
+        torch.cuda.set_rng_state_all(states['cuda'])
+
+def save_checkpoint(state, fn):
+
+    '''
+    Save the training state to `fn` atomically, so that an interruption while saving
+    leaves the previous checkpoint intact.
+    '''
+
+    tmp_fn = f'{fn}.tmp'
+    torch.save(state, tmp_fn)
+    os.replace(tmp_fn, fn)
+
+def load_checkpoint(fn):
+
+    # the checkpoint holds RNG states of numpy and python, which are not plain tensors,
+    # and is loaded on the CPU since the RNG states need to be; the model and optimizer
+    # states are moved to the device when loaded into them
+    return torch.load(fn, map_location=torch.device('cpu'), weights_only=False)
\ No newline at end of file
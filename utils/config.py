@@ -18,7 +18,7 @@ def layer_sizes(args):
     return out
 
 
-def parse_arguments(return_others=False):
+def parse_arguments(return_others=False, args=None):
 
     parser = argparse.ArgumentParser()
 
@@ -86,7 +86,21 @@ def parse_arguments(return_others=False):
         '--schedule_lr', type=lambda x: bool(strtobool(x)), default=True,
         help='Whether to reduce the learning rate if the validation metrics plateau.'
     )
+    parser.add_argument(
+        '--patience', type=int, default=None,
+        help='Number of epochs without improvement in the validation loss (MAE for regression) to stop training after.\n' \
+            '\tThe model at the best epoch is saved in ${exp_dir}/ckpt-best.pt. Skip to train for all epochs.'
+    )
 
+    parser.add_argument(
+        '--collate_once', type=lambda x: bool(strtobool(x)), default=False,
+        help='Boolean value indicating whether to collate graph datasets once, and gather the mini-batches on the device.\n' \
+            '\tThe mini-batches are the same as with re-collating them every epoch, but faster for small graphs.'
+    )
+    parser.add_argument(
+        '--prefetch', type=int, default=0,
+        help='Number of mini-batches of graph datasets to prepare ahead in a background thread; 0 to not prefetch.'
+    )
     parser.add_argument(
         '--device_index', type=int, default=None,
         help="Index of the GPU to use; skip if you're using CPU."
@@ -101,17 +115,39 @@ def parse_arguments(return_others=False):
         help='Number of epochs of training to save the model after.\n' \
             '\tSpecial cases: skip to never save and -1 to save at the last epoch.'
     )
+    parser.add_argument(
+        '--checkpoint_every', type=int, default=None,
+        help='Number of epochs of training to checkpoint the full training state after, for resuming with --resume.\n' \
+            '\tThe checkpoint is kept in ${exp_dir}/resume.pt, overwriting the previous one.'
+    )
+    parser.add_argument(
+        '--resume', type=lambda x: bool(strtobool(x)), default=False,
+        help='Boolean value indicating whether to continue the run in ${exp_dir} from its checkpoint, if any.\n' \
+            '\tWithout a checkpoint, the run is started over in ${exp_dir}.'
+    )
 
     parser.add_argument(
         '--exp_dir', type=str, required=True,
         help='Directory to log the experiment in.'
     )
+    parser.add_argument(
+        '--replicates', type=int, default=1,
+        help='Number of independently initialized models to train together in one process.\n' \
+            '\tReplicate i is logged in ${exp_dir}-i when training more than one.'
+    )
+    parser.add_argument(
+        '--text_metrics', type=lambda x: bool(strtobool(x)), default=True,
+        help='Boolean value indicating whether to also write the metrics to the text logs.\n' \
+            '\tThey are always written to ${exp_dir}/metrics.jsonl.'
+    )
 
-    config, _ = parser.parse_known_args()
+    config, _ = parser.parse_known_args(args)
     config.gnn_layer_sizes = layer_sizes(config.gnn_layer_sizes)
     config.ffn_layer_sizes = layer_sizes(config.ffn_layer_sizes)
     if config.dropout == 'NoDrop':
         config.drop_p = 0.0 
+    if config.patience is not None and config.test_every < 1:
+        raise ValueError(f'Early stopping requires testing periodically (got `test_every` = {config.test_every}).')
 
     if not return_others:
         return config
@@ -127,6 +163,11 @@ def parse_arguments(return_others=False):
         help='Shortest distance between node pairs when dataset is SyntheticZINC_SD.\n \
             Commute times percentile when dataset is SyntheticZINC_CT.'
     )
+    parser.add_argument(
+        '--ct_eps', type=float,
+        help='Relative error of the approximate commute times when dataset is SyntheticZINC_CT.\n \
+            The commute times are exact if nothing is passed.'
+    )
 
     parser.add_argument(
         '--attention_heads', type=int,
@@ -153,13 +194,44 @@ def parse_arguments(return_others=False):
         '--info_loss_ratio', type=float,
         help='Ratio of information to preserve per edge when dropout is DropSens.'
     )
+    parser.add_argument(
+        '--cache_qs', type=lambda x: bool(strtobool(x)), default=False,
+        help='Boolean value indicating whether to reuse the per-edge dropping probabilities when dropout is DropSens.\n \
+            Only valid for node-level tasks, where the graph is the same in every forward pass.'
+    )
+
+    parser.add_argument(
+        '--segment_aggr', type=lambda x: bool(strtobool(x)), default=False,
+        help='Boolean value indicating whether to aggregate the messages to each node as a segment of the edges, instead of scattering them.\n \
+            Only applies to edges sorted by destination, as loaded from the datasets; the results are the same up to floating point rounding.'
+    )
+    parser.add_argument(
+        '--sparse_backend', type=lambda x: bool(strtobool(x)), default=False,
+        help='Boolean value indicating whether GCN, ResGCN, APPNP and GIN aggregate by a sparse-dense matmul with a fixed CSR adjacency matrix.\n \
+            The edges dropped from it are zeroed instead of removed, with the same results; does not apply to DropMessage in training.'
+    )
+    parser.add_argument(
+        '--packed_masks', type=lambda x: bool(strtobool(x)), default=False,
+        help='Boolean value indicating whether Dropout, DropNode, DropEdge, DropMessage and DropAgg draw their masks from random integers, and keep them as bits for backward.\n \
+            The masks are distributed the same (up to a 1/2^16 resolution of the probabilities), but are different draws than the default ones.'
+    )
+    parser.add_argument(
+        '--skip_sampling', type=lambda x: bool(strtobool(x)), default=False,
+        help='Boolean value indicating whether DropEdge and DropSens draw the positions of the kept edges, as geometric gaps between them, when at most half of them are expected to be kept.\n \
+            The cost then scales with the number of kept edges, instead of all of them; the edges are distributed the same, but are different draws.'
+    )
+    parser.add_argument(
+        '--attention_chunk_size', type=int,
+        help='Number of edges in each chunk in which GAT computes and aggregates the messages, recomputing them in backward.\n \
+            Bounds the memory of the messages by the chunk size, instead of the number of edges, with the same results.'
+    )
 
     parser.add_argument(
         '--model_sample', type=int,
         help='Model sample to load weights from when dataset is SyntheticZINC.'
     )
     
-    others, unknown = parser.parse_known_args()
+    others, unknown = parser.parse_known_args(args)
 
     i = 0
     while i < len(unknown):
@@ -1,7 +1,9 @@
 import os
+import json
+import time
 from argparse import Namespace
 from datetime import datetime
-from typing import Union, List, Tuple
+from typing import Union, Optional, List, Tuple
 
 
 def get_time():
@@ -16,20 +18,43 @@ def sci_notation(x, decimals=6, strip=True):
 
 class Logger:
 
-    def __init__(self, config: Namespace, others: Union[Namespace, None] = None):
+    def __init__(
+        self,
+        config: Namespace,
+        others: Union[Namespace, None] = None,
+        text_metrics: bool = True,
+        offsets: Optional[Tuple[int, int]] = None,
+    ):
 
         '''
         Initialize the logging directory:
             ./results/<dataset>/<gnn_layer>/<drop_strategy>/<datetime>/
 
+        Metrics are written as JSON lines to ./<exp_dir>/metrics.jsonl, one record per (epoch, split, metric).
+        The configuration and other messages are written to ./<exp_dir>/logs, which mirrors the metrics too
+        unless `text_metrics` is False. Both files are kept open and buffered; call `flush` to write them out.
+
         Args:
-            dataset (str): dataset name.
-            model (str): model name.
+            config (Namespace): command line arguments.
+            others (Namespace): other arguments, eg. dataset dependent ones.
+            text_metrics (bool): also write the metrics to the human-readable logs.
+            offsets (Tuple[int, int]): when resuming a run, the sizes of the logs and the metrics stream
+                at its checkpoint (as returned by `tell`); anything written after is discarded.
         '''
         
         # self.exp_dir = f'./results/{config.dropout}/{config.dataset}/{config.gnn}/L={len(config.gnn_layer_sizes)}/P={round(config.drop_p, 6)}/{get_time()}'
         self.exp_dir = config.exp_dir
-        os.makedirs(self.exp_dir)
+        os.makedirs(self.exp_dir, exist_ok=offsets is not None)
+        self.text_metrics = text_metrics
+        self.logs_file = open(f'{self.exp_dir}/logs', 'a')
+        self.metrics_file = open(f'{self.exp_dir}/metrics.jsonl', 'a')
+        if offsets is not None:
+            # drop the epochs logged after the checkpoint, since they are run again
+            for file, offset in zip((self.logs_file, self.metrics_file), offsets):
+                file.truncate(offset)
+                file.seek(offset)
+            if offsets[0] > 0:
+                return
         
         self.log(''.join(f'{k} = {v}\n' for k, v in vars(config).items()), with_time=False)
         # with open(f'{self.exp_dir}/config.pkl', 'wb') as f:
@@ -39,6 +64,7 @@ class Logger:
             self.log(''.join(f'{k} = {v}\n' for k, v in vars(others).items()), with_time=False)
         # with open(f'{self.exp_dir}/others.pkl', 'wb') as f:
         #     pickle.dump(others, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.flush()
 
     def log(
         self,
@@ -61,17 +87,53 @@ class Logger:
             print(text)
         if with_time:
             text = f"{get_time()}: {text}"
-        with open(f'{self.exp_dir}/logs', 'a') as f:
-            f.write(text + '\n')
+        self.logs_file.write(text + '\n')
 
     def log_metrics(
         self,
         metrics: List[Tuple[str, float]],
         prefix: str = '',
         with_time: bool = True,
-        print_text: bool = False
+        print_text: bool = False,
+        epoch: Optional[int] = None,
+        split: Optional[str] = None,
     ):
 
-        formatted_metrics = prefix
-        formatted_metrics += ', '.join(f'{metric} = {sci_notation(value, decimals=6, strip=False)}' for metric, value in metrics)
-        self.log(formatted_metrics, with_time, print_text)
\ No newline at end of file
+        '''
+        Write metrics to the metrics stream: ./<exp_dir>/metrics.jsonl
+        and (if `text_metrics`) to the logging file: ./<exp_dir>/logs
+
+        Args:
+            metrics (List[Tuple[str, float]]): (metric name, value) pairs.
+            prefix (str): text to prepend to the metrics in the logging file, eg. '\tTraining: '.
+            epoch (int): epoch the metrics were computed at.
+            split (str): split the metrics were computed on, eg. 'Training'.
+        '''
+
+        wall_time = time.time()
+        for metric, value in metrics:
+            record = {'epoch': epoch, 'split': split, 'metric': metric, 'value': value, 'wall_time': wall_time}
+            self.metrics_file.write(json.dumps(record) + '\n')
+
+        if self.text_metrics or print_text:
+            formatted_metrics = prefix
+            formatted_metrics += ', '.join(f'{metric} = {sci_notation(value, decimals=6, strip=False)}' for metric, value in metrics)
+            if self.text_metrics:
+                self.log(formatted_metrics, with_time, print_text)
+            else:
+                print(formatted_metrics)
+
+    def tell(self):
+
+        self.flush()
+        return self.logs_file.tell(), self.metrics_file.tell()
+
+    def flush(self):
+
+        self.logs_file.flush()
+        self.metrics_file.flush()
+
+    def close(self):
+
+        self.logs_file.close()
+        self.metrics_file.close()
\ No newline at end of file
@@ -1,3 +1,5 @@
+import json
+import os
 from collections import defaultdict
 
 
@@ -22,8 +24,41 @@ def parse_configs(fn):
     return config, others
 
 
+def parse_metrics_stream(fn):
+
+    '''
+    Read the metrics stream (./<exp_dir>/metrics.jsonl) written by `utils.logger.Logger`.
+    Returns the same structure as `parse_metrics`.
+    '''
+
+    results = {
+        'Training': defaultdict(list),
+        'Validation': defaultdict(list),
+        'Testing': defaultdict(list),
+    }
+
+    with open(fn, 'r') as f:
+        for line in f:
+            # the last line may be partially written if the run is still in progress
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                break
+            split = results[record['split']]
+            if not split['Epoch'] or split['Epoch'][-1] != record['epoch']:
+                split['Epoch'].append(record['epoch'])
+            split[record['metric']].append(record['value'])
+
+    return dict(results['Training']), dict(results['Validation']), dict(results['Testing'])
+
+
 def parse_metrics(fn):
 
+    # prefer the metrics stream, which is exact and is written even if the text logs skip the metrics
+    stream_fn = f'{os.path.dirname(fn)}/metrics.jsonl'
+    if os.path.isfile(stream_fn):
+        return parse_metrics_stream(stream_fn)
+
     results = {
         'Training': defaultdict(list),
         'Validation': defaultdict(list),
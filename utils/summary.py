@@ -0,0 +1,101 @@
+import json
+import os
+from typing import List, Tuple
+
+
+# metrics for which higher values are better; lower values are better for the others, eg. losses and errors
+MAXIMIZED_METRICS = ('Accuracy', 'F1 Score', 'AU-ROC')
+
+
+def is_better(metric, value, best_value):
+
+    # strict inequality keeps the earliest best epoch, like np.argmax and np.argmin
+    if best_value is None:
+        return True
+    return value > best_value if metric in MAXIMIZED_METRICS else value < best_value
+
+
+class Summary:
+
+    def __init__(self, exp_dir: str, n_epochs: int):
+
+        '''
+        Summary of a run, maintained online during training and written to ./<exp_dir>/summary.json:
+            - for each metric, the epoch with the best validation value, and the validation and test values at it
+            - for each metric, the statistics indexed by utils.warehouse (see STATISTICS there), so that the logs
+              of the run need not be parsed to index it
+            - the number of completed epochs, and whether the run is complete
+
+        Args:
+            exp_dir (str): logging directory of the run.
+            n_epochs (int): number of epochs the run is configured to train for.
+        '''
+
+        self.fn = f'{exp_dir}/summary.json'
+        self.n_epochs = n_epochs
+        self.completed_epochs = 0
+        self.complete = False
+        self.best = dict()
+        self.statistics = dict()
+
+    def metric_statistics(self, metric):
+
+        return self.statistics.setdefault(metric, {
+            'n_train': 0, 'n_test': 0, 'train_max': None, 'train_min': None, 'train_final': None,
+            'val_max': None, 'val_min': None, 'test_at_val_max': None, 'test_at_val_min': None, 'test_final': None,
+        })
+
+    def update_train(self, train_metrics: List[Tuple[str, float]]):
+
+        for metric, value in train_metrics:
+            statistics = self.metric_statistics(metric)
+            statistics['n_train'] += 1
+            statistics['train_max'] = value if statistics['train_max'] is None else max(statistics['train_max'], value)
+            statistics['train_min'] = value if statistics['train_min'] is None else min(statistics['train_min'], value)
+            statistics['train_final'] = value
+
+    def update(self, epoch: int, val_metrics: List[Tuple[str, float]], test_metrics: List[Tuple[str, float]]):
+
+        test_metrics = dict(test_metrics)
+        for metric, value in val_metrics:
+            if is_better(metric, value, self.best.get(metric, dict()).get('val')):
+                self.best[metric] = {'epoch': epoch, 'val': value, 'test': test_metrics.get(metric)}
+            # the earliest epoch with the highest and lowest validation values, like np.argmax and np.argmin
+            statistics = self.metric_statistics(metric)
+            if statistics['val_max'] is None or value > statistics['val_max']:
+                statistics['val_max'], statistics['test_at_val_max'] = value, test_metrics.get(metric)
+            if statistics['val_min'] is None or value < statistics['val_min']:
+                statistics['val_min'], statistics['test_at_val_min'] = value, test_metrics.get(metric)
+        for metric, value in test_metrics.items():
+            statistics = self.metric_statistics(metric)
+            statistics['n_test'] += 1
+            statistics['test_final'] = value
+
+    def save(self, completed_epochs: int, complete: bool = False):
+
+        self.completed_epochs, self.complete = completed_epochs, complete
+        summary = {
+            'n_epochs': self.n_epochs,
+            'completed_epochs': self.completed_epochs,
+            'complete': self.complete,
+            'best': self.best,
+            'statistics': self.statistics,
+        }
+        # write to a temporary file first, so that readers never see a partially written summary
+        tmp_fn = f'{self.fn}.tmp'
+        with open(tmp_fn, 'w') as f:
+            json.dump(summary, f)
+        os.replace(tmp_fn, self.fn)
+
+
+def load_summary(exp_dir: str):
+
+    '''
+    Read the summary of a run, or return None if the run did not write one.
+    '''
+
+    fn = f'{exp_dir}/summary.json'
+    if not os.path.isfile(fn):
+        return None
+    with open(fn, 'r') as f:
+        return json.load(f)
\ No newline at end of file
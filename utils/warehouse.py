@@ -0,0 +1,338 @@
+'''
+Index of the training runs under ./results, so that the tables and plots do not re-parse the logs of every run.
+
+    python -m utils.warehouse --results_dir ./results
+
+Ingestion is incremental: a run is (re)parsed only if its logs changed since the last ingestion,
+and runs whose directories were deleted are dropped from the index. The statistics of a run are read
+from its summary (./<exp_dir>/summary.json, see utils.summary), and from its logs only if it has none.
+'''
+
+import argparse
+import ast
+import json
+import os
+import sqlite3
+from collections import defaultdict
+from typing import Optional
+
+import numpy as np
+
+from utils.parse_logs import parse_configs, parse_metrics
+from utils.summary import MAXIMIZED_METRICS, load_summary
+
+
+RESULTS_DIR = './results'
+DB_FN = f'{RESULTS_DIR}/warehouse.db'
+# columns to group the samples by, ie. one cell of a table
+KEY = ('dataset', 'gnn', 'dropout', 'drop_p', 'info_loss_ratio')
+# databases indexed with an older schema are rebuilt
+SCHEMA_VERSION = 2
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    exp_dir TEXT PRIMARY KEY,
+    parent_dir TEXT NOT NULL,
+    mtime INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    dataset TEXT,
+    gnn TEXT,
+    dropout TEXT,
+    drop_p REAL,
+    info_loss_ratio REAL,
+    depth INTEGER,
+    completed_epochs INTEGER,
+    complete INTEGER,
+    config TEXT,
+    others TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_key ON runs (dataset, gnn, dropout, drop_p, info_loss_ratio);
+CREATE INDEX IF NOT EXISTS runs_parent_dir ON runs (parent_dir);
+CREATE TABLE IF NOT EXISTS summaries (
+    exp_dir TEXT NOT NULL REFERENCES runs (exp_dir) ON DELETE CASCADE,
+    metric TEXT NOT NULL,
+    n_train INTEGER,
+    n_test INTEGER,
+    train_max REAL,
+    train_min REAL,
+    train_final REAL,
+    test_at_val_max REAL,
+    test_at_val_min REAL,
+    test_final REAL,
+    best_epoch INTEGER,
+    PRIMARY KEY (exp_dir, metric)
+);
+'''
+
+# summary statistics of each metric of a run
+STATISTICS = ('n_train', 'n_test', 'train_max', 'train_min', 'train_final', 'test_at_val_max', 'test_at_val_min', 'test_final', 'best_epoch')
+
+
+def stat_run(exp_dir):
+
+    # a run changes whenever its text logs, its metrics stream or its summary do
+    mtime, size = 0, 0
+    for fn in ('logs', 'metrics.jsonl', 'summary.json'):
+        if os.path.isfile(f'{exp_dir}/{fn}'):
+            stat = os.stat(f'{exp_dir}/{fn}')
+            mtime, size = max(mtime, stat.st_mtime_ns), size + stat.st_size
+
+    return mtime, size
+
+def to_float(value):
+
+    return None if value in (None, 'None') else float(value)
+
+def summarize(train, val, test):
+
+    '''
+    Summary statistics of each metric of a run, eg. the test metric at the epoch with the best validation metric,
+    from its logs. Ties are broken by the earliest epoch, like np.argmax and np.argmin.
+    '''
+
+    summaries = dict()
+    for metric, train_values in train.items():
+        if metric == 'Epoch':
+            continue
+        val_values, test_values = val.get(metric, []), test.get(metric, [])
+        summaries[metric] = {
+            'n_train': len(train_values),
+            'n_test': len(test_values),
+            'train_max': max(train_values, default=None),
+            'train_min': min(train_values, default=None),
+            'train_final': train_values[-1] if train_values else None,
+            'test_at_val_max': test_values[np.argmax(val_values)] if test_values and val_values else None,
+            'test_at_val_min': test_values[np.argmin(val_values)] if test_values and val_values else None,
+            'test_final': test_values[-1] if test_values else None,
+            'best_epoch': val['Epoch'][(np.argmax if metric in MAXIMIZED_METRICS else np.argmin)(val_values)] if val_values else None,
+        }
+
+    return summaries
+
+def summarize_summary(summary):
+
+    '''
+    Summary statistics of each metric of a run, from its summary, with the best epoch of `Summary.best`.
+    '''
+
+    summaries = dict()
+    for metric, statistics in summary['statistics'].items():
+        summaries[metric] = {statistic: statistics.get(statistic) for statistic in STATISTICS}
+        summaries[metric]['best_epoch'] = summary['best'].get(metric, dict()).get('epoch')
+
+    return summaries
+
+
+class Warehouse:
+
+    def __init__(self, db_fn: str = DB_FN):
+
+        '''
+        SQLite index of the runs, with their configurations and summaries of their metrics.
+
+        Args:
+            db_fn (str): path to the database, created if it does not exist.
+        '''
+
+        os.makedirs(os.path.dirname(db_fn) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(db_fn)
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        if self.connection.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+            self.connection.executescript('DROP TABLE IF EXISTS summaries; DROP TABLE IF EXISTS runs;')
+            self.connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        self.connection.executescript(SCHEMA)
+
+    def ingest(self, results_dir: str = RESULTS_DIR, verbose: bool = False):
+
+        '''
+        Index the runs under `results_dir` that are new or changed since the last ingestion,
+        and drop the runs under it that no longer exist.
+
+        Args:
+            results_dir (str): directory to search for runs, ie. directories with a `logs` file.
+            verbose (bool): print the number of runs ingested and dropped.
+        '''
+
+        results_dir = os.path.normpath(results_dir)
+        indexed = dict(
+            (exp_dir, (mtime, size)) for exp_dir, mtime, size in self.connection.execute(
+                'SELECT exp_dir, mtime, size FROM runs WHERE exp_dir = ? OR substr(exp_dir, 1, ?) = ?',
+                (results_dir, len(results_dir)+1, f'{results_dir}{os.sep}'),
+            )
+        )
+
+        n_ingested, found = 0, set()
+        for exp_dir, dirnames, filenames in os.walk(results_dir):
+            if 'logs' not in filenames:
+                continue
+            exp_dir = os.path.normpath(exp_dir)
+            found.add(exp_dir)
+            mtime, size = stat_run(exp_dir)
+            if indexed.get(exp_dir) == (mtime, size):
+                continue
+            self.ingest_run(exp_dir, mtime, size)
+            n_ingested += 1
+
+        removed = [(exp_dir,) for exp_dir in indexed if exp_dir not in found]
+        self.connection.executemany('DELETE FROM runs WHERE exp_dir = ?', removed)
+        self.connection.commit()
+
+        if verbose:
+            n_incomplete = sum(1 for exp_dir, in self.connection.execute('SELECT exp_dir FROM runs WHERE complete = 0') if exp_dir in found)
+            print(f'Ingested {n_ingested} runs and dropped {len(removed)} runs under {results_dir}; {n_incomplete} of its runs are incomplete.')
+
+        return n_ingested, len(removed)
+
+    def ingest_run(self, exp_dir: str, mtime: int, size: int):
+
+        config, others = parse_configs(f'{exp_dir}/logs')
+        summary = load_summary(exp_dir)
+        if summary is not None and 'statistics' in summary:
+            summaries = summarize_summary(summary)
+            completed_epochs, complete = summary['completed_epochs'], summary['complete']
+        else:
+            # runs without a summary (or with one from before it kept the statistics) are summarized from their
+            # logs, and are complete if they trained for all of their epochs, since they could not stop early
+            train, val, test = parse_metrics(f'{exp_dir}/logs')
+            summaries = summarize(train, val, test)
+            completed_epochs = train['Epoch'][-1] if train.get('Epoch') else 0
+            complete = summary['complete'] if summary is not None else completed_epochs == int(config.get('n_epochs', -1))
+
+        depth = len(ast.literal_eval(config['gnn_layer_sizes'])) if 'gnn_layer_sizes' in config else None
+        self.connection.execute('DELETE FROM runs WHERE exp_dir = ?', (exp_dir,))
+        self.connection.execute(
+            'INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (
+                exp_dir, os.path.dirname(exp_dir), mtime, size,
+                config.get('dataset'), config.get('gnn'), config.get('dropout'),
+                to_float(config.get('drop_p')), to_float(others.get('info_loss_ratio')), depth,
+                completed_epochs, int(complete),
+                json.dumps(config), json.dumps(others),
+            )
+        )
+        self.connection.executemany(
+            f'INSERT INTO summaries VALUES (?, ?, {", ".join("?" for _ in STATISTICS)})',
+            [(exp_dir, metric, *(summary[statistic] for statistic in STATISTICS)) for metric, summary in summaries.items()],
+        )
+
+    def query(self, metric: str, statistics, by=KEY, complete=None, min_test=None, n_train=None, **filters):
+
+        '''
+        Summary statistics of `metric`, grouped by the columns `by`, for the runs matching the filters.
+        Runs are ordered by their directories, ie. by the time they were started.
+
+        Args:
+            metric (str): name of the metric, eg. 'Accuracy'.
+            statistics (Union[str, Tuple[str]]): one or more of STATISTICS, eg. 'test_at_val_max'.
+            by (Union[str, Tuple[str]]): columns of `runs` to group by, eg. KEY or 'parent_dir'.
+            complete (bool): only runs that are (or are not) complete, ie. that trained for all of their epochs
+                or stopped early, as marked in their summaries.
+            min_test (int): only runs with at least these many test evaluations.
+            n_train (int): only runs with exactly these many training epochs.
+            filters: equality filters on the columns of `runs`, eg. dataset='Cora' or depth=4;
+                a list or tuple of values is matched with IN.
+        Returns:
+            samples (dict): maps the values of `by` (a scalar if `by` is a string) to a list of
+                statistics (a scalar if `statistics` is a string), one per run.
+        '''
+
+        columns = (by,) if isinstance(by, str) else tuple(by)
+        values = (statistics,) if isinstance(statistics, str) else tuple(statistics)
+        for column in (*columns, *filters):
+            if column not in ('exp_dir', 'parent_dir', *KEY, 'depth'):
+                raise ValueError(f'Unknown column `{column}`.')
+        for statistic in values:
+            if statistic not in STATISTICS:
+                raise ValueError(f'Unknown statistic `{statistic}`.')
+
+        conditions, parameters = ['summaries.metric = ?'], [metric]
+        if complete is not None:
+            conditions.append('runs.complete = ?'); parameters.append(int(complete))
+        if min_test is not None:
+            conditions.append('summaries.n_test >= ?'); parameters.append(min_test)
+        if n_train is not None:
+            conditions.append('summaries.n_train = ?'); parameters.append(n_train)
+        for column, value in filters.items():
+            if isinstance(value, (list, tuple)):
+                conditions.append(f'runs.{column} IN ({", ".join("?" for _ in value)})'); parameters.extend(value)
+            elif value is None:
+                conditions.append(f'runs.{column} IS NULL')
+            else:
+                conditions.append(f'runs.{column} = ?'); parameters.append(value)
+
+        rows = self.connection.execute(
+            f'SELECT {", ".join(f"runs.{column}" for column in columns)}, {", ".join(f"summaries.{statistic}" for statistic in values)} '
+            f'FROM runs JOIN summaries ON runs.exp_dir = summaries.exp_dir '
+            f'WHERE {" AND ".join(conditions)} ORDER BY runs.exp_dir',
+            parameters,
+        )
+
+        samples = defaultdict(list)
+        for row in rows:
+            key, value = row[:len(columns)], row[len(columns):]
+            samples[key[0] if isinstance(by, str) else key].append(value[0] if isinstance(statistics, str) else value)
+
+        return dict(samples)
+
+    def best_val_test(self, metric: str, maximize: Optional[bool] = None, by=KEY, complete=None, min_test=None, **filters):
+
+        '''
+        Test metric at the epoch with the best validation metric, of each run, grouped by the columns `by`,
+        ie. at the best epoch of its summary, eg. the one kept by early stopping.
+        Eg. best_val_test('Accuracy', complete=True, dataset='Cora', depth=4)[('Cora', 'GCN', 'DropEdge', 0.5, None)]
+
+        Args:
+            maximize (bool): whether the best validation metric is the highest (eg. accuracy) or the lowest (eg. loss),
+                by default as in utils.summary.
+            the others are as in `query`.
+        '''
+
+        if maximize is None:
+            maximize = metric in MAXIMIZED_METRICS
+        statistic = 'test_at_val_max' if maximize else 'test_at_val_min'
+
+        return self.query(metric, statistic, by=by, complete=complete, min_test=min_test, **filters)
+
+    def runs(self, **filters):
+
+        '''
+        Configurations of the runs matching the (equality) filters on the columns of `runs`.
+        '''
+
+        for column in filters:
+            if column not in ('exp_dir', 'parent_dir', *KEY, 'depth'):
+                raise ValueError(f'Unknown column `{column}`.')
+        conditions = ' AND '.join(f'{column} = ?' for column in filters) or '1'
+        rows = self.connection.execute(
+            f'SELECT exp_dir, config, others FROM runs WHERE {conditions} ORDER BY exp_dir',
+            tuple(filters.values()),
+        )
+
+        return [(exp_dir, json.loads(config), json.loads(others)) for exp_dir, config, others in rows]
+
+    def close(self):
+
+        self.connection.close()
+
+
+def load_warehouse(results_dir: str = RESULTS_DIR, db_fn: str = DB_FN):
+
+    '''
+    Open the warehouse, after ingesting any new or changed runs under `results_dir`.
+    '''
+
+    warehouse = Warehouse(db_fn)
+    warehouse.ingest(results_dir, verbose=True)
+
+    return warehouse
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--results_dir', type=str, default=RESULTS_DIR, help='Directory to search for runs.')
+    parser.add_argument('--db_fn', type=str, default=DB_FN, help='Path to the SQLite database.')
+    args = parser.parse_args()
+
+    warehouse = Warehouse(args.db_fn)
+    warehouse.ingest(args.results_dir, verbose=True)
+    warehouse.close()
\ No newline at end of file